@@ -9,20 +9,23 @@ Extracts and analyzes historical battle data from Victoria 3 save files, showing
 - Geographic distribution of battles
 """
 
-import json
 import argparse
+import csv
 import os
+import sys
+import traceback
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache
 
+import numpy as np
 
-def load_save_file(filepath):
-    """Load and parse Victoria 3 save file."""
-    print(f"Loading save file: {filepath}")
-    with open(filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return data
+from save_index import load_index
+from save_loader import iter_database
 
+# Row templates for the chronological and recent battle listings
+BATTLE_ROW_FORMAT = "{:<12} #{:<5} {:<8} {:<10} {:<20}\n".format
+RECENT_BATTLE_FORMAT = "{}: War #{} - {} at Province {} - {}\n".format
 
 def get_latest_save():
     """Find the most recent extracted save file."""
@@ -44,6 +47,7 @@ def get_country_name(data, tag):
     return tag
 
 
+@lru_cache(maxsize=None)
 def parse_date(date_str):
     """Parse Victoria 3 date format (YYYY.M.D.H)."""
     if not date_str:
@@ -60,139 +64,120 @@ def parse_date(date_str):
     return date_str
 
 
-def analyze_battles(data):
-    """Analyze battle history in the save file."""
-    wars = data.get('war_manager', {}).get('database', {})
-    battles = data.get('battle_manager', {}).get('database', {})
-    game_date = data.get('meta_data', {}).get('game_date', 'Unknown')
+def count_by_frequency(values):
+    """Count distinct values, most frequent first (ties keep first-seen order)."""
+    uniques, first_seen, counts = np.unique(values, return_index=True, return_counts=True)
+    order = np.lexsort((first_seen, -counts))
+    return list(zip(uniques[order].tolist(), counts[order].tolist()))
+
+
+def analyze_battles(index, out=sys.stdout):
+    """Analyze battle history from the save index."""
+    game_date = str(index['game_date'])
     
-    print(f"\n{'='*70}")
-    print(f"Victoria 3 Battle History Report - {game_date}")
-    print(f"{'='*70}\n")
+    print(f"\n{'='*70}", file=out)
+    print(f"Victoria 3 Battle History Report - {game_date}", file=out)
+    print(f"{'='*70}\n", file=out)
     
-    if not battles:
-        print("No battle data found in save file.")
+    battle_count = int(index['battle_count'])
+    if not battle_count:
+        print("No battle data found in save file.", file=out)
         return
     
-    # Collect all battles
-    all_battles = []
-    battle_count = len(battles)
-    
-    for battle_id, battle_data in battles.items():
-        if isinstance(battle_data, dict):
-            battle_info = {
-                'battle_id': battle_id,
-                'war_id': battle_data.get('war', ''),
-                'date': battle_data.get('date', ''),
-                'type': battle_data.get('type', ''),
-                'status': battle_data.get('status', ''),
-                'province': battle_data.get('province', ''),
-                'attacker_province': battle_data.get('attacker_province', ''),
-                'front': battle_data.get('front', ''),
-                'name': battle_data.get('name', {}),
-                'casualties': battle_data.get('casualties', {}),
-                'victory': battle_data.get('victory', {}),
-                'occupation': battle_data.get('occupation', {})
-            }
-            all_battles.append(battle_info)
-    
-    print(f"BATTLE SUMMARY")
-    print(f"{'-'*70}")
-    print(f"Total Wars: {len(wars)}")
-    print(f"Total Battles: {battle_count}")
-    
-    if not all_battles:
-        print("No battle data found.")
+    # Battle columns in chronological order
+    order = np.argsort(index['battle_date'], kind='stable')
+    date_col = index['battle_date'][order]
+    type_col = index['battle_type'][order]
+    status_col = index['battle_status'][order]
+    province_col = index['battle_province'][order]
+    
+    dates = date_col.tolist()
+    war_ids = index['battle_war'][order].tolist()
+    types = type_col.tolist()
+    statuses = status_col.tolist()
+    province_ids = province_col.tolist()
+    
+    print(f"BATTLE SUMMARY", file=out)
+    print(f"{'-'*70}", file=out)
+    print(f"Total Wars: {int(index['war_count'])}", file=out)
+    print(f"Total Battles: {battle_count}", file=out)
+    
+    if not dates:
+        print("No battle data found.", file=out)
         return
     
-    # Sort battles by date
-    all_battles.sort(key=lambda x: x['date'])
-    
-    print(f"\nCHRONOLOGICAL BATTLE LIST")
-    print(f"{'-'*70}")
-    print(f"{'Date':<12} {'War':<6} {'Type':<8} {'Province':<10} {'Status':<20}")
-    print(f"{'-'*70}")
-    
-    for battle in all_battles:
-        date = parse_date(battle['date']) or 'Unknown'
-        war_id = battle['war_id'] or 'N/A'
-        battle_type = battle['type'] or 'Unknown'
-        province = str(battle['province']) if battle['province'] else 'Unknown'
-        status = battle['status'] or 'Unknown'
+    # Tally years, types, provinces and outcomes
+    unique_dates, date_counts = np.unique(date_col[date_col != ''], return_counts=True)
+    battles_by_year = {}
+    for date, count in zip(unique_dates.tolist(), date_counts.tolist()):
+        year = date.split('.')[0]
+        battles_by_year[year] = battles_by_year.get(year, 0) + count
+    
+    battle_types = count_by_frequency(type_col[type_col != ''])
+    provinces = count_by_frequency(province_col[province_col != 0])
+    results = count_by_frequency(status_col[status_col != ''])
+    
+    print(f"\nCHRONOLOGICAL BATTLE LIST", file=out)
+    print(f"{'-'*70}", file=out)
+    print(f"{'Date':<12} {'War':<6} {'Type':<8} {'Province':<10} {'Status':<20}", file=out)
+    print(f"{'-'*70}", file=out)
+    
+    rows = []
+    for date, war_id, battle_type, province, status in zip(dates, war_ids, types,
+                                                            province_ids, statuses):
+        date = parse_date(date) or 'Unknown'
+        war_id = war_id or 'N/A'
+        battle_type = battle_type or 'Unknown'
+        province = str(province) if province else 'Unknown'
+        status = status or 'Unknown'
         
-        print(f"{date:<12} #{war_id:<5} {battle_type:<8} {province:<10} {status:<20}")
+        rows.append(BATTLE_ROW_FORMAT(date, war_id, battle_type, province, status))
+    out.write(''.join(rows))
     
     # Analyze by year
-    print(f"\n\nBATTLES BY YEAR")
-    print(f"{'-'*30}")
-    
-    battles_by_year = {}
-    for battle in all_battles:
-        date = battle['date']
-        if date:
-            try:
-                year = date.split('.')[0]
-                battles_by_year[year] = battles_by_year.get(year, 0) + 1
-            except:
-                pass
+    print(f"\n\nBATTLES BY YEAR", file=out)
+    print(f"{'-'*30}", file=out)
     
     for year in sorted(battles_by_year.keys()):
         count = battles_by_year[year]
-        print(f"{year}: {count} battles")
+        print(f"{year}: {count} battles", file=out)
     
     # Battle types
-    print(f"\n\nBATTLE TYPES")
-    print(f"{'-'*30}")
-    
-    battle_types = {}
-    for battle in all_battles:
-        battle_type = battle['type']
-        if battle_type:
-            battle_types[battle_type] = battle_types.get(battle_type, 0) + 1
+    print(f"\n\nBATTLE TYPES", file=out)
+    print(f"{'-'*30}", file=out)
     
-    for battle_type, count in sorted(battle_types.items(), key=lambda x: x[1], reverse=True):
-        print(f"{battle_type:<20} {count:3} battles")
+    for battle_type, count in battle_types:
+        print(f"{battle_type:<20} {count:3} battles", file=out)
     
     # Geographic distribution by province
-    print(f"\n\nBATTLE LOCATIONS (by Province)")
-    print(f"{'-'*40}")
+    print(f"\n\nBATTLE LOCATIONS (by Province)", file=out)
+    print(f"{'-'*40}", file=out)
     
-    provinces = {}
-    for battle in all_battles:
-        province = battle['province']
-        if province:
-            provinces[province] = provinces.get(province, 0) + 1
-    
-    sorted_provinces = sorted(provinces.items(), key=lambda x: x[1], reverse=True)[:15]
-    for province, count in sorted_provinces:
-        print(f"Province {province:<15} {count:3} battles")
+    for province, count in provinces[:15]:
+        print(f"Province {province:<15} {count:3} battles", file=out)
     
     # Battle results analysis
-    print(f"\n\nBATTLE OUTCOMES")
-    print(f"{'-'*30}")
-    
-    results = {}
-    for battle in all_battles:
-        result = battle['status']
-        if result:
-            results[result] = results.get(result, 0) + 1
+    print(f"\n\nBATTLE OUTCOMES", file=out)
+    print(f"{'-'*30}", file=out)
     
-    for result, count in sorted(results.items(), key=lambda x: x[1], reverse=True):
-        print(f"{result:<25} {count:3} battles")
+    for result, count in results:
+        print(f"{result:<25} {count:3} battles", file=out)
     
     # Recent battle activity
-    print(f"\n\nRECENT BATTLES (Last 10)")
-    print(f"{'-'*60}")
-    
-    recent_battles = all_battles[-10:] if len(all_battles) >= 10 else all_battles
-    for battle in recent_battles:
-        date = parse_date(battle['date']) or 'Unknown'
-        war_id = battle['war_id'] or 'N/A'
-        battle_type = battle['type'] or 'Unknown'
-        province = str(battle['province']) if battle['province'] else 'Unknown'
-        status = battle['status'] or 'Unknown'
+    print(f"\n\nRECENT BATTLES (Last 10)", file=out)
+    print(f"{'-'*60}", file=out)
+    
+    rows = []
+    for date, war_id, battle_type, province, status in zip(dates[-10:], war_ids[-10:], types[-10:],
+                                                            province_ids[-10:], statuses[-10:]):
+        date = parse_date(date) or 'Unknown'
+        war_id = war_id or 'N/A'
+        battle_type = battle_type or 'Unknown'
+        province = str(province) if province else 'Unknown'
+        status = status or 'Unknown'
         
-        print(f"{date}: War #{war_id} - {battle_type} at Province {province} - {status}")
+        rows.append(RECENT_BATTLE_FORMAT(date, war_id, battle_type, province, status))
+    out.write(''.join(rows))
 
 
 def main():
@@ -216,47 +201,44 @@ def main():
     
     # Load and analyze
     try:
-        data = load_save_file(savefile)
+        if not args.csv:
+            print(f"Loading save index: {savefile}")
+            data = load_index(savefile)
         
         # Redirect output if specified
         if args.output:
-            import sys
-            original_stdout = sys.stdout
-            with open(args.output, 'w') as f:
-                sys.stdout = f
+            with open(args.output, 'w', buffering=1 << 20) as f:
                 if args.csv:
-                    generate_csv_output(data)
+                    generate_csv_output(savefile, out=f)
                 else:
-                    analyze_battles(data)
-            sys.stdout = original_stdout
+                    analyze_battles(data, out=f)
             print(f"Battle history report saved to: {args.output}")
         else:
             if args.csv:
-                generate_csv_output(data)
+                generate_csv_output(savefile)
             else:
                 analyze_battles(data)
             
     except Exception as e:
         print(f"Error analyzing save file: {e}")
-        import traceback
         traceback.print_exc()
 
 
-def generate_csv_output(data):
-    """Generate CSV format output for battles."""
-    battles = data.get('battle_manager', {}).get('database', {})
-    
-    print("Date,War,Type,Province,Status")
-    
-    for battle_id, battle_data in battles.items():
-        if isinstance(battle_data, dict):
-            date = parse_date(battle_data.get('date', ''))
-            war_id = battle_data.get('war', '')
-            battle_type = battle_data.get('type', '')
-            province = battle_data.get('province', '')
-            status = battle_data.get('status', '')
-            
-            print(f"{date},{war_id},{battle_type},{province},{status}")
+def generate_csv_output(savefile, out=sys.stdout):
+    """Generate CSV format output for battles, streaming them from the save."""
+    battles = iter_database(savefile, 'battle_manager.database')
+    
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(['Date', 'War', 'Type', 'Province', 'Status'])
+    writer.writerows(
+        (parse_date(battle_data.get('date', '')),
+         battle_data.get('war', ''),
+         battle_data.get('type', ''),
+         battle_data.get('province', ''),
+         battle_data.get('status', ''))
+        for battle_id, battle_data in battles
+        if isinstance(battle_data, dict)
+    )
 
 
 if __name__ == "__main__":
@@ -13,61 +13,58 @@ Shows companies by country in the format:
 etc.
 """
 
-import json
-import os
-from collections import defaultdict
+import argparse
+import sys
+from functools import lru_cache
+from pathlib import Path
 
-def load_save_data(filepath):
-    """Load JSON save data from file."""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+import numpy as np
+
+from save_index import get_country_tags, get_state_country_lookup, load_index
+from save_loader import load_human_countries
 
-def get_country_tag(countries, country_id):
-    """Get country tag from country ID."""
-    country = countries.get(str(country_id), {})
-    if isinstance(country, dict):
-        definition = country.get('definition', '')
-        if definition:
-            return definition
-    return f"ID_{country_id}"
+# Company name mappings based on building types
+COMPANY_NAMES = {
+    'building_company_us_steel': 'Carnegie Steel Company',
+    'building_company_panama_canal': 'Panama Canal Company', 
+    'building_company_lee_wilson': 'Lee Wilson & Company',
+    'building_company_suez_canal': 'Suez Canal Company',
+    'building_company_armstrong_whitworth': 'Sir W.G. Armstrong Whitworth & Co',
+    'building_company_anglo_persian_oil': 'Anglo-Persian Oil Company',
+    'building_company_bolckow_vaughan': 'Bolckow, Vaughan & Co',
+    'building_company_tata_group': 'Tata Group',
+    'building_company_david_sassoon': 'David Sassoon & Co',
+    'building_company_dollfus_mieg': 'Dollfus-Mieg et Compagnie',
+    'building_company_generale_voitures': 'Compagnie Générale des Voitures',
+    'building_company_schneider': 'Schneider et Cie',
+    'building_company_altos_hornos': 'Altos Hornos de Vizcaya',
+    'building_company_espana_industrial': 'España Industrial',
+    'building_company_mitsui': 'Mitsui & Co',
+    'building_company_zastava': 'Zastava',
+    'building_company_ong_lung_sheng': 'Ong Lung Sheng Tea Company',
+    'building_company_russian_american': 'Russian-American Company',
+    'building_company_basic_metalworks': 'Basic Metalworks Company',
+    'building_company_basic_steel': 'Basic Steel Company',
+    'building_company_basic_paper': 'Basic Paper Manufacturing',
+    'building_company_basic_home_goods': 'Basic Home Goods Company',
+    'building_company_basic_colonial_plantations': 'Basic Colonial Plantations Company',
+    'building_company_basic_food': 'Basic Food Company',
+    'building_company_basic_gold_mining': 'Basic Gold Mining Company',
+    'building_company_basic_wine_fruit': 'Basic Wine and Fruit Company',
+    'building_company_basic_paper_company': 'Basic Paper Company',
+    'building_company_basic_metal_mining': 'Basic Metal Mining Company',
+}
+
+def load_save_data(filepath):
+    """Load the flat column index for a save file."""
+    return load_index(filepath)
 
+@lru_cache(maxsize=None)
 def format_company_name(building_type, company_name=None):
     """Format company name for display."""
-    # Company name mappings based on building types
-    company_names = {
-        'building_company_us_steel': 'Carnegie Steel Company',
-        'building_company_panama_canal': 'Panama Canal Company', 
-        'building_company_lee_wilson': 'Lee Wilson & Company',
-        'building_company_suez_canal': 'Suez Canal Company',
-        'building_company_armstrong_whitworth': 'Sir W.G. Armstrong Whitworth & Co',
-        'building_company_anglo_persian_oil': 'Anglo-Persian Oil Company',
-        'building_company_bolckow_vaughan': 'Bolckow, Vaughan & Co',
-        'building_company_tata_group': 'Tata Group',
-        'building_company_david_sassoon': 'David Sassoon & Co',
-        'building_company_dollfus_mieg': 'Dollfus-Mieg et Compagnie',
-        'building_company_generale_voitures': 'Compagnie Générale des Voitures',
-        'building_company_schneider': 'Schneider et Cie',
-        'building_company_altos_hornos': 'Altos Hornos de Vizcaya',
-        'building_company_espana_industrial': 'España Industrial',
-        'building_company_mitsui': 'Mitsui & Co',
-        'building_company_zastava': 'Zastava',
-        'building_company_ong_lung_sheng': 'Ong Lung Sheng Tea Company',
-        'building_company_russian_american': 'Russian-American Company',
-        'building_company_basic_metalworks': 'Basic Metalworks Company',
-        'building_company_basic_steel': 'Basic Steel Company',
-        'building_company_basic_paper': 'Basic Paper Manufacturing',
-        'building_company_basic_home_goods': 'Basic Home Goods Company',
-        'building_company_basic_colonial_plantations': 'Basic Colonial Plantations Company',
-        'building_company_basic_food': 'Basic Food Company',
-        'building_company_basic_gold_mining': 'Basic Gold Mining Company',
-        'building_company_basic_wine_fruit': 'Basic Wine and Fruit Company',
-        'building_company_basic_paper_company': 'Basic Paper Company',
-        'building_company_basic_metal_mining': 'Basic Metal Mining Company',
-    }
-    
     # Try to get the proper name
-    if building_type in company_names:
-        return company_names[building_type]
+    if building_type in COMPANY_NAMES:
+        return COMPANY_NAMES[building_type]
     
     # Fallback: clean up the building type name
     if building_type.startswith('building_company_'):
@@ -77,21 +74,17 @@ def format_company_name(building_type, company_name=None):
     
     return building_type
 
-def analyze_companies(save_data):
+def analyze_companies(index):
     """Analyze companies by country."""
-    countries = save_data.get('country_manager', {}).get('database', {})
-    buildings = save_data.get('building_manager', {}).get('database', {})
-    states = save_data.get('states', {}).get('database', {})
+    state_to_country = get_state_country_lookup(index)
     
-    # Track companies by country
-    companies_by_country = defaultdict(list)
+    # Company buildings as parallel (state, company name) columns
+    company_states = []
+    company_names = []
     
     # Find all company buildings
-    for building_id, building in buildings.items():
-        if not isinstance(building, dict):
-            continue
-            
-        building_type = building.get('building', '')
+    for building_type, state_id in zip(index['building_type'].tolist(),
+                                       index['building_state'].tolist()):
         if not building_type or 'company' not in building_type:
             continue
         
@@ -99,42 +92,51 @@ def analyze_companies(save_data):
         if 'regional' in building_type.lower():
             continue
             
-        # Get building location
-        state_id = str(building.get('state'))
-        if not state_id or state_id not in states:
-            continue
-            
-        state = states[state_id]
-        country_id = state.get('country')
-        if not country_id:
-            continue
-            
-        # Format company name
-        company_name = format_company_name(building_type)
-        
-        companies_by_country[country_id].append(company_name)
-    
-    # Sort companies within each country
-    for country_id in companies_by_country:
-        companies_by_country[country_id].sort()
-    
-    return companies_by_country, countries
+        company_states.append(state_id)
+        company_names.append(format_company_name(building_type))
+    
+    # Resolve building locations to owning countries in one indexing pass
+    state_codes = np.array(company_states, dtype=np.int64)
+    known = (state_codes >= 0) & (state_codes < len(state_to_country))
+    country_codes = np.full(len(state_codes), -1, dtype=np.int64)
+    country_codes[known] = state_to_country[state_codes[known]]
+    owned = country_codes > 0  # country 0 counts as unowned, like a falsy reference
+    country_codes = country_codes[owned]
+    company_names = [name for name, keep in zip(company_names, owned) if keep]
+    
+    if not company_names:
+        return {}, get_country_tags(index)
+    
+    # Encode names by sort rank, then order by (country, name) in one sort
+    unique_names = sorted(set(company_names))
+    name_rank = {name: rank for rank, name in enumerate(unique_names)}
+    name_codes = np.fromiter((name_rank[name] for name in company_names),
+                             dtype=np.int64, count=len(company_names))
+    order = np.lexsort((name_codes, country_codes))
+    sorted_countries = country_codes[order]
+    sorted_names = name_codes[order]
+    
+    # Split at country boundaries, keeping first-seen country order
+    boundaries = np.flatnonzero(np.diff(sorted_countries)) + 1
+    companies_by_country = dict.fromkeys(country_codes.tolist())
+    for country_group, name_group in zip(np.split(sorted_countries, boundaries),
+                                         np.split(sorted_names, boundaries)):
+        companies_by_country[int(country_group[0])] = [unique_names[code] for code in name_group]
+    
+    return companies_by_country, get_country_tags(index)
 
-def generate_companies_report(save_data, humans_only=True):
+def generate_companies_report(index, humans_only=True):
     """Generate companies report."""
     # Load human countries if filtering
-    human_countries = set()
-    if humans_only and os.path.exists('humans.txt'):
-        with open('humans.txt', 'r') as f:
-            human_countries = {line.strip() for line in f if line.strip()}
+    human_countries = load_human_countries() if humans_only else frozenset()
     
-    companies_by_country, countries = analyze_companies(save_data)
+    companies_by_country, country_tags = analyze_companies(index)
     
     # Prepare report data
     report_data = []
     
     for country_id, companies in companies_by_country.items():
-        tag = get_country_tag(countries, country_id)
+        tag = country_tags.get(country_id, f"ID_{country_id}")
         
         # Filter by human countries if requested
         if humans_only and human_countries and tag not in human_countries:
@@ -148,29 +150,27 @@ def generate_companies_report(save_data, humans_only=True):
     
     return report_data
 
-def print_companies_report(report_data):
+def print_companies_report(report_data, out=sys.stdout):
     """Print companies report in the requested format."""
-    print("COMPANIES BY COUNTRY")
-    print("=" * 30)
-    print()
+    print("COMPANIES BY COUNTRY", file=out)
+    print("=" * 30, file=out)
+    print(file=out)
     
     if not report_data:
-        print("No companies found.")
+        print("No companies found.", file=out)
         return
     
     for tag, companies in report_data:
         count = len(companies)
-        print(f"  {tag} ({count} Compan{'y' if count == 1 else 'ies'})")
-        print()
+        print(f"  {tag} ({count} Compan{'y' if count == 1 else 'ies'})", file=out)
+        print(file=out)
         
         for company in companies:
-            print(f"  - {company}")
+            print(f"  - {company}", file=out)
         
-        print()
+        print(file=out)
 
 def main():
-    import argparse
-    
     parser = argparse.ArgumentParser(description='Generate Victoria 3 companies reports')
     parser.add_argument('save_file', nargs='?', help='Path to extracted JSON save file')
     parser.add_argument('-o', '--output', help='Output file for the report')
@@ -184,7 +184,6 @@ def main():
         save_path = args.save_file
     else:
         # Use latest extracted save
-        from pathlib import Path
         extracted_dir = Path('extracted-saves')
         if not extracted_dir.exists():
             print("Error: extracted-saves directory not found")
@@ -208,13 +207,8 @@ def main():
     
     # Generate output
     if args.output:
-        with open(args.output, 'w') as f:
-            # Redirect print to file
-            import sys
-            old_stdout = sys.stdout
-            sys.stdout = f
-            print_companies_report(report_data)
-            sys.stdout = old_stdout
+        with open(args.output, 'w', buffering=1 << 20) as f:
+            print_companies_report(report_data, out=f)
         print(f"Companies report saved to: {args.output}")
     else:
         print_companies_report(report_data)
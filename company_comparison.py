@@ -4,27 +4,33 @@ Compare company profitability between two Victoria 3 sessions.
 Shows growth in profit and changes in company rankings.
 """
 
-import json
+import heapq
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
 from pathlib import Path
 from company_localization import get_company_display_name
+from save_loader import load_databases
 
-def load_companies(save_file):
+# Gainer/loser table row; profits are given in millions
+ROW_FMT = "{rank:<5} {name:<40} {country:<8} £{s1:>10.2f}M £{s2:>10.2f}M £{change:>+13.2f}M {pct:>+7.1f}%\n"
+
+# Country ID to tag mapping
+COUNTRY_MAP = {
+    1: 'GBR', 3: 'RUS', 4: 'FRA', 5: 'PRS', 8: 'ITA', 9: 'USA',
+    17: 'JAP', 23: 'TUR', 30: 'AUS', 36: 'SPA', 63: 'POR',
+    92: 'CHI', 94: 'YUG', 121: 'ETH', 155: 'SIA', 193: 'KOR',
+    199: 'PER', 216: 'BIC', 40: 'BEL', 53: 'SER', 55: 'GRE'
+}
+
+def _load_companies(save_file):
     """Load and process company data from a save file."""
-    with open(save_file, 'r') as f:
-        data = json.load(f)
-    
-    companies = data.get('companies', {}).get('database', {})
-    buildings = data.get('building_manager', {}).get('database', {})
-    ownership = data.get('building_ownership_manager', {}).get('database', {})
+    data = load_databases(save_file, ['companies.database', 'building_manager.database'])
     
-    # Country ID to tag mapping
-    country_map = {
-        1: 'GBR', 3: 'RUS', 4: 'FRA', 5: 'PRS', 8: 'ITA', 9: 'USA',
-        17: 'JAP', 23: 'TUR', 30: 'AUS', 36: 'SPA', 63: 'POR', 
-        92: 'CHI', 94: 'YUG', 121: 'ETH', 155: 'SIA', 193: 'KOR',
-        199: 'PER', 216: 'BIC', 40: 'BEL', 53: 'SER', 55: 'GRE'
-    }
+    companies = data['companies.database']
+    buildings = {int(bid): building for bid, building in data['building_manager.database'].items()}
     
     company_data = {}
     
@@ -41,19 +47,18 @@ def load_companies(save_file):
         
         # Get country tag
         country_id = company.get('country', 0)
-        country_tag = country_map.get(country_id, f'C{country_id}')
+        country_tag = COUNTRY_MAP.get(country_id, f'C{country_id}')
         
         # Calculate UI display profit (main building + regional HQs)
         ui_profit = 0
-        main_building_id = str(company.get('building', ''))
+        main_building_id = company.get('building')
         if main_building_id in buildings:
             ui_profit += buildings[main_building_id].get('ownership_income', 0)
         
         # Add regional HQs income
         for hq_id in company.get('regional_hqs', []):
-            hq_bid = str(hq_id)
-            if hq_bid in buildings:
-                ui_profit += buildings[hq_bid].get('ownership_income', 0)
+            if hq_id in buildings:
+                ui_profit += buildings[hq_id].get('ownership_income', 0)
         
         # Create unique key for comparison (company type + country)
         # This helps match companies across sessions even if IDs change
@@ -73,14 +78,32 @@ def load_companies(save_file):
     
     return company_data
 
+@lru_cache(maxsize=8)
+def _load_companies_cached(save_file, mtime_ns):
+    """Load company data, cached per save file path and modification time."""
+    return _load_companies(save_file)
+
+def load_companies(save_file):
+    """Load and process company data from a save file.
+    
+    Results are cached, so comparing many session pairs parses each save
+    only once. The returned data is shared and must not be modified.
+    """
+    return _load_companies_cached(str(save_file), os.stat(save_file).st_mtime_ns)
+
 def compare_sessions(session1_file, session2_file, output_file=None):
     """Compare company data between two sessions."""
     
-    print(f"Loading Session 1: {session1_file}")
-    session1 = load_companies(session1_file)
-    
-    print(f"Loading Session 2: {session2_file}")
-    session2 = load_companies(session2_file)
+    # The two sessions are independent, so load them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        print(f"Loading Session 1: {session1_file}")
+        future1 = executor.submit(load_companies, session1_file)
+        
+        print(f"Loading Session 2: {session2_file}")
+        future2 = executor.submit(load_companies, session2_file)
+        
+        session1 = future1.result()
+        session2 = future2.result()
     
     # Find matching companies and calculate changes
     comparisons = []
@@ -133,76 +156,95 @@ def compare_sessions(session1_file, session2_file, output_file=None):
                 'status': 'removed'
             })
     
-    # Sort by absolute profit change
-    comparisons.sort(key=lambda x: abs(x['change']), reverse=True)
-    
-    # Generate report
-    output = []
-    output.append("=" * 100)
-    output.append("VICTORIA 3 COMPANY PROFIT COMPARISON")
-    output.append("=" * 100)
-    output.append("")
-    
-    # Extract session names from filenames
-    s1_name = Path(session1_file).stem.replace('_extracted', '')
-    s2_name = Path(session2_file).stem.replace('_extracted', '')
-    
-    output.append(f"Comparing: {s1_name} → {s2_name}")
-    output.append("")
-    
-    # Top gainers
-    output.append("TOP PROFIT GAINERS")
-    output.append("-" * 100)
-    output.append(f"{'Rank':<5} {'Company':<40} {'Country':<8} {s1_name[:10]:<12} {s2_name[:10]:<12} {'Change':<15} {'%':<8}")
-    output.append("-" * 100)
-    
-    gainers = [c for c in comparisons if c['change'] > 0][:20]
-    for i, comp in enumerate(gainers, 1):
-        name = comp['name'][:38]
-        output.append(f"{i:<5} {name:<40} {comp['country']:<8} £{comp['s1_profit']/1000000:>10.2f}M £{comp['s2_profit']/1000000:>10.2f}M £{comp['change']/1000000:>+13.2f}M {comp['pct_change']:>+7.1f}%")
-    
-    # Top losers
-    output.append("")
-    output.append("TOP PROFIT LOSERS")
-    output.append("-" * 100)
-    output.append(f"{'Rank':<5} {'Company':<40} {'Country':<8} {s1_name[:10]:<12} {s2_name[:10]:<12} {'Change':<15} {'%':<8}")
-    output.append("-" * 100)
-    
-    losers = [c for c in comparisons if c['change'] < 0][:20]
-    for i, comp in enumerate(losers, 1):
-        name = comp['name'][:38]
-        output.append(f"{i:<5} {name:<40} {comp['country']:<8} £{comp['s1_profit']/1000000:>10.2f}M £{comp['s2_profit']/1000000:>10.2f}M £{comp['change']/1000000:>+13.2f}M {comp['pct_change']:>+7.1f}%")
-    
-    # Summary statistics
-    output.append("")
-    output.append("SUMMARY STATISTICS")
-    output.append("-" * 100)
-    
-    total_s1 = sum(c['s1_profit'] for c in comparisons if c['status'] != 'new')
-    total_s2 = sum(c['s2_profit'] for c in comparisons if c['status'] != 'removed')
-    total_change = total_s2 - total_s1
-    
-    new_companies = len([c for c in comparisons if c['status'] == 'new'])
-    removed_companies = len([c for c in comparisons if c['status'] == 'removed'])
-    existing_companies = len([c for c in comparisons if c['status'] == 'existing'])
-    
-    output.append(f"Total profit {s1_name}: £{total_s1/1000000:,.2f}M")
-    output.append(f"Total profit {s2_name}: £{total_s2/1000000:,.2f}M")
-    output.append(f"Total change: £{total_change/1000000:+,.2f}M ({(total_change/total_s1*100) if total_s1 > 0 else 0:+.1f}%)")
-    output.append("")
-    output.append(f"Companies in both sessions: {existing_companies}")
-    output.append(f"New companies: {new_companies}")
-    output.append(f"Removed companies: {removed_companies}")
-    
-    # Output results
-    report_text = '\n'.join(output)
+    # Single pass: split gainers/losers and tally totals and status counts
+    gainers = []
+    losers = []
+    total_s1 = 0
+    total_s2 = 0
+    status_counts = {'new': 0, 'removed': 0, 'existing': 0}
     
+    for comp in comparisons:
+        status = comp['status']
+        status_counts[status] += 1
+        if status != 'new':
+            total_s1 += comp['s1_profit']
+        if status != 'removed':
+            total_s2 += comp['s2_profit']
+        
+        if comp['change'] > 0:
+            gainers.append(comp)
+        elif comp['change'] < 0:
+            losers.append(comp)
+    
+    # Biggest changes first (only the top 20 of each are reported)
+    gainers = heapq.nlargest(20, gainers, key=lambda x: x['change'])
+    losers = heapq.nsmallest(20, losers, key=lambda x: x['change'])
+    
+    # Generate report, writing straight to the output file (or stdout)
     if output_file:
-        with open(output_file, 'w') as f:
-            f.write(report_text)
-        print(f"Report saved to: {output_file}")
+        report_file = open(output_file, 'w', buffering=1 << 20)
     else:
-        print(report_text)
+        report_file = nullcontext(sys.stdout)
+    
+    with report_file as out:
+        emit = out.write
+        
+        emit("=" * 100 + "\n")
+        emit("VICTORIA 3 COMPANY PROFIT COMPARISON\n")
+        emit("=" * 100 + "\n")
+        emit("\n")
+        
+        # Extract session names from filenames
+        s1_name = Path(session1_file).stem.replace('_extracted', '')
+        s2_name = Path(session2_file).stem.replace('_extracted', '')
+        
+        emit(f"Comparing: {s1_name} → {s2_name}\n")
+        emit("\n")
+        
+        # Top gainers
+        emit("TOP PROFIT GAINERS\n")
+        emit("-" * 100 + "\n")
+        emit(f"{'Rank':<5} {'Company':<40} {'Country':<8} {s1_name[:10]:<12} {s2_name[:10]:<12} {'Change':<15} {'%':<8}\n")
+        emit("-" * 100 + "\n")
+        
+        for i, comp in enumerate(gainers, 1):
+            emit(ROW_FMT.format(rank=i, name=comp['name'][:38], country=comp['country'],
+                                s1=comp['s1_profit'] / 1e6, s2=comp['s2_profit'] / 1e6,
+                                change=comp['change'] / 1e6, pct=comp['pct_change']))
+        
+        # Top losers
+        emit("\n")
+        emit("TOP PROFIT LOSERS\n")
+        emit("-" * 100 + "\n")
+        emit(f"{'Rank':<5} {'Company':<40} {'Country':<8} {s1_name[:10]:<12} {s2_name[:10]:<12} {'Change':<15} {'%':<8}\n")
+        emit("-" * 100 + "\n")
+        
+        for i, comp in enumerate(losers, 1):
+            emit(ROW_FMT.format(rank=i, name=comp['name'][:38], country=comp['country'],
+                                s1=comp['s1_profit'] / 1e6, s2=comp['s2_profit'] / 1e6,
+                                change=comp['change'] / 1e6, pct=comp['pct_change']))
+        
+        # Summary statistics
+        emit("\n")
+        emit("SUMMARY STATISTICS\n")
+        emit("-" * 100 + "\n")
+        
+        total_change = total_s2 - total_s1
+        
+        new_companies = status_counts['new']
+        removed_companies = status_counts['removed']
+        existing_companies = status_counts['existing']
+        
+        emit(f"Total profit {s1_name}: £{total_s1/1000000:,.2f}M\n")
+        emit(f"Total profit {s2_name}: £{total_s2/1000000:,.2f}M\n")
+        emit(f"Total change: £{total_change/1000000:+,.2f}M ({(total_change/total_s1*100) if total_s1 > 0 else 0:+.1f}%)\n")
+        emit("\n")
+        emit(f"Companies in both sessions: {existing_companies}\n")
+        emit(f"New companies: {new_companies}\n")
+        emit(f"Removed companies: {removed_companies}\n")
+    
+    if output_file:
+        print(f"Report saved to: {output_file}")
 
 def main():
     if len(sys.argv) < 3:
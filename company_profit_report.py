@@ -4,10 +4,12 @@ Extract company names and profitability from Victoria 3 save files.
 Companies in V3 own multiple buildings - we need to sum their profits.
 """
 
-import json
 import sys
+import numpy as np
+from collections import defaultdict
 from pathlib import Path
 from company_localization import get_company_display_name
+from save_loader import load_databases, load_human_countries
 
 def get_latest_save():
     """Get the most recent extracted save file."""
@@ -24,21 +26,32 @@ def get_latest_save():
     return latest
 
 def extract_company_profits(save_file, humans_only=False):
-    """Extract company names and calculate total profits from all their buildings."""
+    """Extract company names and calculate total profits from all their buildings.
+    
+    Returns the companies of the report table: every company, or with
+    humans_only just those of human countries (ranks stay global).
+    """
     
     print(f"Loading save file: {save_file}")
-    with open(save_file, 'r') as f:
-        data = json.load(f)
+    data = load_databases(save_file, ['companies.database', 'building_manager.database',
+                                      'building_ownership_manager.database',
+                                      'country_manager.database'])
     
-    companies = data.get('companies', {}).get('database', {})
-    buildings = data.get('building_manager', {}).get('database', {})
-    ownership = data.get('building_ownership_manager', {}).get('database', {})
-    countries = data.get('country_manager', {}).get('database', {})
+    companies = data['companies.database']
+    buildings = data['building_manager.database']
+    ownership = data['building_ownership_manager.database']
+    countries = data['country_manager.database']
     
     print(f"Found {len(companies)} companies")
     
     # Build a map of building ownership
-    company_buildings = {}  # company_id -> list of building_ids
+    company_buildings = defaultdict(list)  # company_id -> list of building_ids
+    
+    # Reverse index: company headquarters building -> company (first company wins)
+    building_to_company = {}
+    for cid, company in companies.items():
+        if 'building' in company:
+            building_to_company.setdefault(company['building'], cid)
     
     # Method 1: Check ownership database for company-owned buildings
     for owner_id, owner_data in ownership.items():
@@ -48,29 +61,77 @@ def extract_company_profits(save_file, humans_only=False):
             owned_building_id = owner_data.get('building')
             
             # Find which company owns this building
-            for cid, company in companies.items():
-                if str(company.get('building')) == str(company_building_id):
-                    if cid not in company_buildings:
-                        company_buildings[cid] = []
-                    company_buildings[cid].append(str(owned_building_id))
-                    break
+            cid = building_to_company.get(company_building_id)
+            if cid is not None:
+                company_buildings[cid].append(owned_building_id)
     
     # Method 2: Add the main building each company owns
     for cid, company in companies.items():
         if 'building' in company:
-            if cid not in company_buildings:
-                company_buildings[cid] = []
-            company_buildings[cid].append(str(company['building']))
+            company_buildings[cid].append(company['building'])
+    
+    # Scatter every (company, building) pair into flat arrays and sum per company
+    # Note: The game displays ownership_income in the company view, not profit_after_reserves
+    # Building IDs are ints everywhere in the save except as JSON object keys,
+    # so key the income lookup by int once instead of str()-ing every reference
+    building_income = {int(bid): building.get('ownership_income', 0)
+                       for bid, building in buildings.items() if isinstance(building, dict)}
+    cid_to_idx = {cid: i for i, cid in enumerate(companies)}
+    
+    bidx = []        # company index of each owned building
+    income = []      # ownership_income of each owned building
+    ui_bidx = []     # company index of each main building / regional HQ
+    ui_income = []   # ownership_income of each main building / regional HQ
+    
+    for cid, company in companies.items():
+        i = cid_to_idx[cid]
+        owned = company_buildings.get(cid, [])
+        for bid in owned:
+            if bid in building_income:
+                bidx.append(i)
+                income.append(building_income[bid])
+        
+        # Also check regional_hqs for additional buildings
+        regional_hqs = company.get('regional_hqs', [])
+        for hq_bid in regional_hqs:
+            if hq_bid in building_income and hq_bid not in owned:
+                bidx.append(i)
+                income.append(building_income[hq_bid])
+        
+        # The game UI shows the sum of main building + regional HQs, not total ownership
+        main_building_id = company.get('building')
+        for bid in [main_building_id] + regional_hqs:
+            if bid in building_income:
+                ui_bidx.append(i)
+                ui_income.append(building_income[bid])
+    
+    n_companies = len(cid_to_idx)
+    bidx = np.array(bidx, dtype=np.int32)
+    ui_bidx = np.array(ui_bidx, dtype=np.int32)
+    
+    totals = np.zeros(n_companies)
+    np.add.at(totals, bidx, np.array(income, dtype=np.float64))
+    ui_totals = np.zeros(n_companies)
+    np.add.at(ui_totals, ui_bidx, np.array(ui_income, dtype=np.float64))
+    building_counts = np.bincount(bidx, minlength=n_companies)
+    
+    totals = totals.tolist()
+    ui_totals = ui_totals.tolist()
+    building_counts = building_counts.tolist()
+    
+    # Load human countries if filtering
+    human_countries = load_human_countries() if humans_only else frozenset()
+    
+    # Global ranks and the summary need every company's profit, but with
+    # --humans only human and custom-named companies are ever printed, so
+    # skip resolving display names for the rest
+    filter_humans = humans_only and bool(human_countries)
     
     # Calculate total profits for each company
     company_data = []
     
     for cid, company in companies.items():
-        # Add ID to company data for display name function
-        company['id'] = cid
-        
-        # Get company display name using localization
-        name = get_company_display_name(company)
+        i = cid_to_idx[cid]
         
         # Get country tag from country_manager
         country_id = company.get('country', 0)
@@ -88,51 +149,21 @@ def extract_company_profits(save_file, humans_only=False):
         if country_tag == 'UNK':
             country_tag = f'C{country_id}'
         
-        # Calculate total profit from all buildings
-        # Note: The game displays ownership_income in the company view, not profit_after_reserves
-        total_profit = 0
-        building_count = 0
-        
-        if cid in company_buildings:
-            for bid in company_buildings[cid]:
-                if bid in buildings:
-                    building = buildings[bid]
-                    # Use ownership_income as that's what the game displays
-                    profit = building.get('ownership_income', 0)
-                    total_profit += profit
-                    building_count += 1
-        
-        # Also check regional_hqs for additional buildings
-        regional_hqs = company.get('regional_hqs', [])
-        for hq_id in regional_hqs:
-            hq_bid = str(hq_id)
-            if hq_bid in buildings and hq_bid not in company_buildings.get(cid, []):
-                building = buildings[hq_bid]
-                # Use ownership_income as that's what the game displays
-                profit = building.get('ownership_income', 0)
-                total_profit += profit
-                building_count += 1
-        
-        # Get main building + regional HQs profit (what the game UI shows)
-        # The game displays the sum of main building + regional HQs, not total ownership
-        ui_display_profit = 0
-        main_building_id = str(company.get('building', ''))
-        if main_building_id in buildings:
-            ui_display_profit += buildings[main_building_id].get('ownership_income', 0)
-        
-        # Add regional HQs income (these are shown in the game UI)
-        for hq_id in company.get('regional_hqs', []):
-            hq_bid = str(hq_id)
-            if hq_bid in buildings:
-                ui_display_profit += buildings[hq_bid].get('ownership_income', 0)
+        name = None
+        if not filter_humans or country_tag in human_countries or company.get('custom_name'):
+            # Add ID to company data for display name function
+            company['id'] = cid
+            
+            # Get company display name using localization
+            name = get_company_display_name(company)
         
         company_data.append({
             'id': cid,
             'name': name,
             'country': country_tag,
-            'building_count': building_count,
-            'profit': total_profit,
-            'ui_display_profit': ui_display_profit,
+            'building_count': building_counts[i],
+            'profit': totals[i],
+            'ui_display_profit': ui_totals[i],
             'company_type': company.get('company_type', 'unknown')
         })
     
@@ -143,17 +174,9 @@ def extract_company_profits(save_file, humans_only=False):
     for i, comp in enumerate(company_data, 1):
         comp['rank'] = i
     
-    # Load human countries if filtering
-    human_countries = set()
-    if humans_only:
-        humans_file = Path('humans.txt')
-        if humans_file.exists():
-            with open(humans_file, 'r') as f:
-                human_countries = {line.strip() for line in f if line.strip() and not line.startswith('#')}
-    
     # Filter to human countries if requested
     display_data = company_data
-    if humans_only and human_countries:
+    if filter_humans:
         display_data = [c for c in company_data if c['country'] in human_countries]
     
     # Print report
@@ -196,13 +219,13 @@ def extract_company_profits(save_file, humans_only=False):
     print("=" * 80)
     
     # Only show companies that have actual custom_name field set
+    company_by_id = {comp['id']: comp for comp in company_data}
     custom_companies = []
     for cid, company in companies.items():
         if company.get('custom_name'):  # Only if custom_name field exists and is not empty
-            for comp in company_data:
-                if comp['id'] == cid:
-                    custom_companies.append(comp)
-                    break
+            comp = company_by_id.get(cid)
+            if comp:
+                custom_companies.append(comp)
     
     custom_companies.sort(key=lambda x: x['ui_display_profit'], reverse=True)
     
@@ -212,7 +235,7 @@ def extract_company_profits(save_file, humans_only=False):
         print(f"  Buildings: {comp['building_count']}")
         print(f"  Profit: £{comp['ui_display_profit']:,.2f}")
     
-    return company_data
+    return display_data
 
 def main():
     # Check for --humans flag
@@ -8,100 +8,114 @@ Shows construction capacity usage by country in the format:
 etc.
 """
 
-import json
 import os
 from collections import defaultdict
 
+import numpy as np
+
+from save_loader import load_json
+
 def load_save_data(filepath):
     """Load JSON save data from file."""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    return load_json(filepath)
 
-def get_country_tag(countries, country_id):
-    """Get country tag from country ID."""
-    country = countries.get(str(country_id), {})
-    if isinstance(country, dict):
+# Fallback country names for tags missing from the localization
+FALLBACK_NAMES = {
+    'USA': 'America',
+    'GBR': 'Great Britain',
+    'BIC': 'British India',
+    'FRA': 'France',
+    'CHI': 'China',
+    'RUS': 'Russia',
+    'ITA': 'Italy',
+    'GER': 'Germany',
+    'JAP': 'Japan',
+    'TUR': 'Ottomans',
+    'POR': 'Portugal',
+    'SPA': 'Spain',
+    'YUG': 'Yugoslavia'
+}
+
+def build_country_lookups(countries, localization):
+    """Build country ID -> tag and country ID -> localized name mappings."""
+    nations = localization.get('nations', {})
+    id_to_tag = {}
+    id_to_name = {}
+    
+    for country_id, country in countries.items():
+        if not isinstance(country, dict):
+            continue
+        
         definition = country.get('definition', '')
-        if definition:
-            return definition
-    return f"ID_{country_id}"
+        tag = definition.strip('"')
+        
+        id_to_tag[country_id] = definition or f"ID_{country_id}"
+        if not tag:
+            id_to_name[country_id] = f"Country_{country_id}"
+        elif tag in nations:
+            id_to_name[country_id] = nations[tag]
+        else:
+            id_to_name[country_id] = FALLBACK_NAMES.get(tag, tag)
+    
+    return id_to_tag, id_to_name
 
-def get_country_name(countries, localization, country_id):
-    """Get localized country name."""
-    country = countries.get(str(country_id), {})
-    if isinstance(country, dict):
-        tag = country.get('definition', '').strip('"')
-        if tag and tag in localization.get('nations', {}):
-            return localization['nations'][tag]
-        elif tag:
-            # Fallback country names
-            fallback_names = {
-                'USA': 'America',
-                'GBR': 'Great Britain', 
-                'BIC': 'British India',
-                'FRA': 'France',
-                'CHI': 'China',
-                'RUS': 'Russia',
-                'ITA': 'Italy',
-                'GER': 'Germany',
-                'JAP': 'Japan',
-                'TUR': 'Ottomans',
-                'POR': 'Portugal',
-                'SPA': 'Spain',
-                'YUG': 'Yugoslavia'
-            }
-            return fallback_names.get(tag, tag)
-    return f"Country_{country_id}"
+def _collect_speeds(queue):
+    """Collect the base construction speeds of a queue's construction elements.
+    
+    Queues are stored either as a list or as an ID -> element dict; elements
+    that are not dicts or have a non-numeric speed are skipped.
+    """
+    if isinstance(queue, dict):
+        elements = queue.values()
+    elif isinstance(queue, list):
+        elements = queue
+    else:
+        return []
+    
+    speeds = []
+    for element in elements:
+        try:
+            speeds.append(float(element.get('base_construction_speed', 0)))
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return speeds
 
 def calculate_construction_usage(save_data):
     """Calculate construction usage from actual save data."""
     countries = save_data.get('country_manager', {}).get('database', {})
     
-    # Track construction usage by country
+    # Track construction usage by country, keyed by the save's own
+    # (string) country IDs
     construction_usage = defaultdict(float)
     
-    # Extract used construction from each country's construction queues
+    # Extract the speed of every queued construction element, tagged with the
+    # index of the country whose queue it sits in
+    country_ids = []
+    owners = []
+    speeds = []
     for country_id, country in countries.items():
         if not isinstance(country, dict):
             continue
-            
-        used_construction = 0
-        
-        # Check government construction queue
-        if 'government_queue' in country:
-            gov_queue = country['government_queue'].get('construction_elements', [])
-            if isinstance(gov_queue, list):
-                for element in gov_queue:
-                    if isinstance(element, dict):
-                        base_speed = element.get('base_construction_speed', 0)
-                        if isinstance(base_speed, (str, int, float)):
-                            used_construction += float(base_speed)
-            elif isinstance(gov_queue, dict):
-                for element_id, element in gov_queue.items():
-                    if isinstance(element, dict):
-                        base_speed = element.get('base_construction_speed', 0)
-                        if isinstance(base_speed, (str, int, float)):
-                            used_construction += float(base_speed)
         
-        # Check private construction queue  
-        if 'private_queue' in country:
-            priv_queue = country['private_queue'].get('construction_elements', [])
-            if isinstance(priv_queue, list):
-                for element in priv_queue:
-                    if isinstance(element, dict):
-                        base_speed = element.get('base_construction_speed', 0)
-                        if isinstance(base_speed, (str, int, float)):
-                            used_construction += float(base_speed)
-            elif isinstance(priv_queue, dict):
-                for element_id, element in priv_queue.items():
-                    if isinstance(element, dict):
-                        base_speed = element.get('base_construction_speed', 0)
-                        if isinstance(base_speed, (str, int, float)):
-                            used_construction += float(base_speed)
+        owner = len(country_ids)
+        country_ids.append(country_id)
         
-        # Store the used construction if > 0
+        # Government and private construction queues
+        for queue_key in ('government_queue', 'private_queue'):
+            if queue_key in country:
+                queue_speeds = _collect_speeds(country[queue_key].get('construction_elements', []))
+                speeds.extend(queue_speeds)
+                owners.extend([owner] * len(queue_speeds))
+    
+    # Sum each country's queues in one pass over the flat arrays
+    used = np.bincount(np.asarray(owners, dtype=np.intp),
+                       weights=np.asarray(speeds, dtype=np.float64),
+                       minlength=len(country_ids))
+    
+    # Store the used construction if > 0
+    for country_id, used_construction in zip(country_ids, used.tolist()):
         if used_construction > 0:
-            construction_usage[int(country_id)] = used_construction
+            construction_usage[country_id] = used_construction
     
     return construction_usage, countries
 
@@ -118,17 +132,19 @@ def generate_construction_report(save_data, humans_only=True):
     # Create localization dict (simplified)
     localization = {'nations': {}}
     
+    id_to_tag, id_to_name = build_country_lookups(countries, localization)
+    
     # Prepare report data
     report_data = []
     
     for country_id, usage in construction_usage.items():
-        tag = get_country_tag(countries, country_id)
+        tag = id_to_tag[country_id]
         
         # Filter by human countries if requested
         if humans_only and human_countries and tag not in human_countries:
             continue
             
-        name = get_country_name(countries, localization, country_id)
+        name = id_to_name[country_id]
         
         if usage > 0:
             report_data.append((tag, name, usage))
@@ -3,23 +3,100 @@
 Create a beautiful population time series chart from Victoria 3 data
 """
 
+import numpy as np
 import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from datetime import datetime, timedelta
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
+try:
+    from tsdownsample import MinMaxLTTBDownsampler
+except ImportError:
+    MinMaxLTTBDownsampler = None
+
+# Series longer than this are downsampled before plotting; a 15" wide figure
+# can't show more than a couple of thousand distinct points per line anyway
+DOWNSAMPLE_THRESHOLD = 4000
+DOWNSAMPLE_POINTS = 2000
+
+def downsample_indices(dates, values, n_out=DOWNSAMPLE_POINTS):
+    """Pick the indices of the points to plot for a long series.
+    
+    Uses tsdownsample's MinMaxLTTB when installed; otherwise keeps the
+    minimum and maximum of n_out / 2 equal-sized buckets (plus both
+    endpoints), which preserves the visible shape of the line.
+    """
+    if MinMaxLTTBDownsampler is not None:
+        return MinMaxLTTBDownsampler().downsample(dates.view('int64'), values, n_out=n_out)
+    
+    n = len(values)
+    bucket_size = -(-n // (n_out // 2))
+    n_buckets = -(-n // bucket_size)
+    
+    # Pad with NaN to a whole number of buckets (the last bucket always keeps
+    # at least one real value)
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n] = values
+    buckets = padded.reshape(n_buckets, bucket_size)
+    offsets = np.arange(n_buckets) * bucket_size
+    
+    indices = np.concatenate([offsets + np.nanargmin(buckets, axis=1),
+                              offsets + np.nanargmax(buckets, axis=1),
+                              [0, n - 1]])
+    return np.unique(indices)
+
+def prepare_series(all_dates, values):
+    """Prepare one country's series for plotting.
+    
+    Drops empty values, converts to millions and downsamples long series.
+    Returns (dates, values), or None when the country has no data.
+    """
+    has_value = ~np.isnan(values)
+    if not has_value.any():
+        return None
+    
+    # Convert population to millions for better readability
+    dates = all_dates[has_value]
+    values = values[has_value] / 1_000_000
+    
+    if len(values) > DOWNSAMPLE_THRESHOLD:
+        indices = downsample_indices(dates, values)
+        dates = dates[indices]
+        values = values[indices]
+    return dates, values
+
+def read_population_csv(csv_file, usecols, dtypes=None):
+    """Read the given columns of the population CSV (empty cells become NaN)"""
+    try:
+        # pyarrow's multithreaded columnar parser is much faster on wide CSVs
+        return pd.read_csv(csv_file, usecols=usecols, dtype=dtypes, na_values=[''], engine='pyarrow')
+    except ImportError:
+        return pd.read_csv(csv_file, usecols=usecols, dtype=dtypes, na_values=[''])
+
 def create_population_chart(csv_file, output_file=None, log_scale=False):
     """Create a pretty population chart from CSV data"""
     
-    # Read the CSV data
-    df = pd.read_csv(csv_file)
+    # Read only the date index and population columns, parsing the populations
+    # as floats up front (empty cells become NaN)
+    header = pd.read_csv(csv_file, nrows=0).columns
+    usecols = [col for col in header if col == 'date_index' or col.endswith('_population')]
+    dtypes = {col: 'float64' for col in usecols if col.endswith('_population')}
+    try:
+        df = read_population_csv(csv_file, usecols, dtypes)
+    except ValueError:
+        # Some cell isn't a number (N/A, stray text, ...): read the columns as
+        # they are and turn such cells into NaN
+        df = read_population_csv(csv_file, usecols)
+        df[list(dtypes)] = df[list(dtypes)].apply(pd.to_numeric, errors='coerce')
     
     # Convert date_index to actual dates (starting from 1836.1.1)
     # Victoria 3 uses daily sampling, so date_index corresponds to days since 1836.1.1
-    game_start = datetime(1836, 1, 1)
-    df['date'] = df['date_index'].apply(lambda x: game_start + timedelta(days=x))
+    game_start = pd.Timestamp(1836, 1, 1)
+    df['date'] = game_start + pd.to_timedelta(df['date_index'], unit='D')
     
     # Set up the plot style
     plt.style.use('default')
@@ -47,20 +124,24 @@ def create_population_chart(csv_file, output_file=None, log_scale=False):
     population_columns = [col for col in df.columns if col.endswith('_population')]
     countries = [col.replace('_population', '') for col in population_columns]
     
+    # Prepare each country's series concurrently (the NumPy work releases
+    # the GIL), then plot them on this thread since matplotlib isn't
+    # thread-safe. Plain datetime64/float arrays let matplotlib skip pandas'
+    # per-point date conversion.
+    all_dates = df['date'].to_numpy()
+    population_values = [df[col].to_numpy(dtype='float64', na_value=np.nan)
+                         for col in population_columns]
+    with ThreadPoolExecutor() as executor:
+        series = list(executor.map(partial(prepare_series, all_dates), population_values))
+    
+    # Get Victoria 3 color for each country, fallback to default if not found
+    colors = [v3_colors.get(country, '#666666') for country in countries]
+    
     # Plot each country's population over time
-    for col, country in zip(population_columns, countries):
-        # Remove empty values and convert to numeric
-        country_data = df[['date', col]].copy()
-        country_data[col] = pd.to_numeric(country_data[col], errors='coerce')
-        country_data = country_data.dropna()
-        
-        if len(country_data) > 0:
-            # Convert population to millions for better readability
-            country_data[col] = country_data[col] / 1_000_000
-            
-            # Get Victoria 3 color for this country, fallback to default if not found
-            color = v3_colors.get(country, '#666666')
-            ax.plot(country_data['date'], country_data[col], 
+    for country, color, prepared in zip(countries, colors, series):
+        if prepared is not None:
+            dates, values = prepared
+            ax.plot(dates, values,
                    linewidth=2.5, label=country, alpha=0.8, color=color)
     
     # Customize the chart (no title)
@@ -112,8 +193,17 @@ def create_population_chart(csv_file, output_file=None, log_scale=False):
     
     # Save or show
     if output_file:
-        plt.savefig(output_file, dpi=300, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none')
+        suffix = Path(output_file).suffix.lower()
+        save_kwargs = {}
+        if suffix in ('.svg', '.pdf'):
+            # Keep text and axes as vectors but rasterize the dense data lines,
+            # which would otherwise dominate the file size and render time
+            for line in ax.get_lines():
+                line.set_rasterized(True)
+        elif suffix == '.png':
+            save_kwargs['pil_kwargs'] = {'optimize': True, 'compress_level': 6}
+        plt.savefig(output_file, dpi=150, bbox_inches='tight',
+                   facecolor='white', edgecolor='none', **save_kwargs)
         print(f"Chart saved to: {output_file}")
     else:
         plt.show()
@@ -121,11 +211,21 @@ def create_population_chart(csv_file, output_file=None, log_scale=False):
     # Print some stats
     print("\nPopulation Growth Summary:")
     print("-" * 50)
-    for col, country in zip(population_columns, countries):
-        country_data = df[col].dropna()
-        if len(country_data) >= 2:
-            start_pop = int(country_data.iloc[0])
-            end_pop = int(country_data.iloc[-1])
+    
+    # First and last recorded population of every country in one vectorized
+    # pass over the population columns
+    populations = df[population_columns].to_numpy(dtype='float64', na_value=np.nan)
+    recorded = ~np.isnan(populations)
+    recorded_counts = recorded.sum(axis=0)
+    if len(populations):
+        column_index = np.arange(len(population_columns))
+        first_pops = populations[recorded.argmax(axis=0), column_index]
+        last_pops = populations[len(populations) - 1 - recorded[::-1].argmax(axis=0), column_index]
+    
+    for i, country in enumerate(countries):
+        if recorded_counts[i] >= 2:
+            start_pop = int(first_pops[i])
+            end_pop = int(last_pops[i])
             growth = (end_pop / start_pop - 1) * 100
             print(f"{country:3s}: {start_pop/1_000_000:6.1f}M → {end_pop/1_000_000:6.1f}M ({growth:+5.1f}%)")
 
@@ -151,7 +251,11 @@ def main():
     if not args.output:
         csv_path = Path(args.csv_file)
         scale_suffix = "_log" if args.log else ""
-        args.output = str(csv_path.parent / f"population_timeseries_chart{scale_suffix}.png")
+        args.output = str(csv_path.parent / f"population_timeseries_chart{scale_suffix}.svg")
+    
+    # The chart is always written to a file, so render with the
+    # non-interactive Agg backend
+    matplotlib.use('Agg')
     
     # Create the chart
     create_population_chart(args.csv_file, args.output, args.log)
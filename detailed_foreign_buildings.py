@@ -7,24 +7,45 @@ Shows:
 2. Foreign ownership within each country
 """
 
-import json
+import heapq
 import os
-from collections import defaultdict
+from collections import Counter
+from functools import lru_cache
+
+import pandas as pd
+
+from save_loader import load_databases, load_human_countries
 
 def load_save_data(filepath):
-    """Load JSON save data from file."""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    """Load the parts of the save this report uses."""
+    return load_databases(filepath, ['country_manager', 'building_manager', 'states',
+                                     'building_ownership_manager'])
+
+def build_country_tags(countries):
+    """Build a country ID -> tag mapping for countries with a definition."""
+    country_tags = {}
+    for country_id, country in countries.items():
+        if isinstance(country, dict) and country.get('definition', ''):
+            country_tags[int(country_id)] = country['definition']
+    return country_tags
 
-def get_country_tag(countries, country_id):
-    """Get country tag from country ID."""
-    country = countries.get(str(country_id), {})
-    if isinstance(country, dict):
-        definition = country.get('definition', '')
-        if definition:
-            return definition
-    return f"ID_{country_id}"
+# Display-name fixups applied (in order) after prettifying a building type
+BUILDING_TYPE_REPLACEMENTS = {
+    'Company Basic': 'Company -',
+    'Company Us Steel': 'US Steel Company',
+    'Company Lee Wilson': 'Lee Wilson Company',
+    'Company Panama Company': 'Panama Company',
+    'Company Suez Company': 'Suez Company',
+    'Company Bolckow Vaughan': 'Bolckow Vaughan Company',
+    'Regional Company': 'Regional Company -',
+    'Gold Fields': 'Gold Mining',
+    'Urban Center': 'Urban Center',
+    'Trade Center': 'Trade Center',
+    'Financial District': 'Financial District',
+    'Manor House': 'Manor House'
+}
 
+@lru_cache(maxsize=4096)
 def format_building_type(building_type):
     """Format building type for display."""
     if not building_type:
@@ -34,121 +55,111 @@ def format_building_type(building_type):
     clean = building_type.replace('building_', '').replace('_', ' ').title()
     
     # Handle specific cases
-    replacements = {
-        'Company Basic': 'Company -',
-        'Company Us Steel': 'US Steel Company',
-        'Company Lee Wilson': 'Lee Wilson Company',
-        'Company Panama Company': 'Panama Company',
-        'Company Suez Company': 'Suez Company',
-        'Company Bolckow Vaughan': 'Bolckow Vaughan Company',
-        'Regional Company': 'Regional Company -',
-        'Gold Fields': 'Gold Mining',
-        'Urban Center': 'Urban Center',
-        'Trade Center': 'Trade Center',
-        'Financial District': 'Financial District',
-        'Manor House': 'Manor House'
-    }
-    
-    for old, new in replacements.items():
+    for old, new in BUILDING_TYPE_REPLACEMENTS.items():
         clean = clean.replace(old, new)
     
     return clean
 
 def analyze_detailed_foreign_ownership(save_data):
-    """Analyze detailed foreign building ownership."""
-    countries = save_data.get('country_manager', {}).get('database', {})
+    """Analyze detailed foreign building ownership.
+    
+    The save data is consumed: it is cleared once the needed databases have
+    been pulled out, so memory can be reclaimed during the analysis.
+    """
+    country_tags = build_country_tags(save_data.get('country_manager', {}).get('database', {}))
     buildings = save_data.get('building_manager', {}).get('database', {})
     states = save_data.get('states', {}).get('database', {})
     ownership_data = save_data.get('building_ownership_manager', {}).get('database', {})
     
+    # Only the databases above are used; release the rest of the save now
+    save_data.clear()
+    
     # Load human countries
-    human_countries = set()
-    if os.path.exists('humans.txt'):
-        with open('humans.txt', 'r') as f:
-            human_countries = {line.strip() for line in f if line.strip()}
+    human_countries = load_human_countries()
     
-    # Track investments by type: investor_country -> {target_country -> {building_type -> levels}}
-    investments_by_type = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    # building_id -> (building type, country of its state), built once and
+    # shared by the owned-building and owner-building lookups. IDs stay the
+    # save's string keys, matching how ownership records are resolved.
+    state_to_country = {state_id: state.get('country') for state_id, state in states.items()
+                        if isinstance(state, dict) and state}
+    building_info = pd.DataFrame(
+        [(building_id, building.get('building', 'unknown'),
+          state_to_country.get(str(building.get('state'))) or 0)
+         for building_id, building in buildings.items() if isinstance(building, dict) and building],
+        columns=['building_id', 'building_type', 'country']).set_index('building_id')
     
-    # Track foreign ownership within countries: target_country -> {investor_country -> {building_type -> levels}}
-    foreign_owned_within = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    ownership_df = pd.DataFrame(
+        [(str(ownership.get('building')), ownership.get('levels', 0),
+          'country' in identity, identity.get('country'),
+          str(identity['building']) if 'building' in identity else None)
+         for ownership in ownership_data.values() if isinstance(ownership, dict)
+         for identity in [ownership.get('identity', {})]],
+        columns=['building_id', 'levels', 'has_country', 'owner_country', 'owner_building_id'])
     
-    for ownership_id, ownership in ownership_data.items():
-        if not isinstance(ownership, dict):
-            continue
-        
-        identity = ownership.get('identity', {})
-        owned_building_id = str(ownership.get('building'))
-        levels = ownership.get('levels', 0)
-        
-        if not (owned_building_id and levels > 0):
-            continue
-        
-        # Get the owned building's details
-        building = buildings.get(owned_building_id)
-        if not building:
-            continue
-        
-        building_type = building.get('building', 'unknown')
-        state_id = str(building.get('state'))
-        if not state_id:
-            continue
-        
-        state = states.get(state_id)
-        if not state:
-            continue
-        
-        target_country = state.get('country')
-        if not target_country:
-            continue
-        
-        # Determine the owner's country and type
-        owner_country = None
-        ownership_method = "unknown"
-        
-        if 'country' in identity:
-            # Direct country ownership
-            owner_country = identity['country']
-            ownership_method = "direct"
-        elif 'building' in identity:
-            # Building-based ownership (company, financial district, etc.)
-            owner_building_id = str(identity['building'])
-            if owner_building_id in buildings:
-                owner_building = buildings[owner_building_id]
-                ownership_method = format_building_type(owner_building.get('building', 'unknown'))
-                owner_state_id = str(owner_building.get('state'))
-                if owner_state_id in states:
-                    owner_state = states[owner_state_id]
-                    owner_country = owner_state.get('country')
-        
-        # Track foreign ownership
-        if owner_country and target_country and owner_country != target_country:
-            formatted_building_type = format_building_type(building_type)
-            
-            # Track investments by the owner
-            investments_by_type[owner_country][target_country][formatted_building_type] += levels
-            
-            # Track foreign ownership within the target country
-            foreign_owned_within[target_country][owner_country][formatted_building_type] += levels
+    # Everything below works on the flat tables, so free the raw databases
+    del buildings, states, ownership_data, state_to_country
+    
+    # Attach the owned building's type and country (the target), dropping
+    # ownerships of unknown buildings
+    owned = ownership_df[(ownership_df['levels'] > 0)
+                         & ownership_df['building_id'].isin(building_info.index)]
+    owned_info = building_info.loc[owned['building_id']]
+    owned = owned.assign(building_type=owned_info['building_type'].to_numpy(),
+                         target_country=owned_info['country'].to_numpy())
+    
+    # Resolve the owner: direct country ownership, or the country of the owning
+    # building (company, financial district, etc.)
+    owner_building_country = owned['owner_building_id'].map(building_info['country'])
+    owned['owner_country'] = owned['owner_country'].where(
+        owned['has_country'], owner_building_country).fillna(0).astype('int64')
     
-    return investments_by_type, foreign_owned_within, countries, human_countries
+    # Track foreign ownership
+    foreign = owned[(owned['target_country'] != 0) & (owned['owner_country'] != 0)
+                    & (owned['owner_country'] != owned['target_country'])]
+    foreign = foreign.assign(building_type=foreign['building_type'].map(format_building_type))
+    
+    # Groups come out in first-seen order, like the original record-by-record scan
+    totals = foreign.groupby(['owner_country', 'target_country', 'building_type'],
+                             sort=False)['levels'].sum()
+    
+    # Flat level counts: (investor, target, building_type) -> levels, and the
+    # same counts keyed (target, investor, building_type) for ownership within
+    investments = Counter(dict(zip(totals.index.tolist(), totals.tolist())))
+    foreign_owned = Counter({(target_country, owner_country, building_type): levels
+                             for (owner_country, target_country, building_type), levels
+                             in investments.items()})
+    
+    return investments, foreign_owned, country_tags, human_countries
+
+def group_levels(levels_by_key):
+    """Group flat (country, other_country, building_type) -> levels counts into
+    country -> {other_country -> {building_type -> levels}}, keeping first-seen order."""
+    grouped = {}
+    for (country_id, other_id, building_type), levels in levels_by_key.items():
+        grouped.setdefault(country_id, {}).setdefault(other_id, {})[building_type] = levels
+    return grouped
 
-def print_investments_abroad(investments_by_type, countries, human_countries):
+def print_investments_abroad(investments, country_tags, human_countries):
     """Print foreign investments made by human countries."""
+    investments_by_type = group_levels(investments)
+    
     print("=" * 80)
     print("FOREIGN INVESTMENTS BY HUMAN COUNTRIES")
     print("=" * 80)
     print()
     
-    # Sort countries by total foreign investment
+    # Sort countries by total foreign investment (per-target totals are
+    # computed once and reused for sorting and printing the targets)
     country_totals = []
+    target_totals = {}
     for investor_id, targets in investments_by_type.items():
-        investor_tag = get_country_tag(countries, investor_id)
+        investor_tag = country_tags.get(investor_id, f"ID_{investor_id}")
         if human_countries and investor_tag not in human_countries:
             continue
         
-        total_levels = sum(sum(building_types.values()) for building_types in targets.values())
-        country_totals.append((investor_tag, investor_id, total_levels))
+        totals = {target_id: sum(building_types.values()) for target_id, building_types in targets.items()}
+        target_totals[investor_id] = totals
+        country_totals.append((investor_tag, investor_id, sum(totals.values())))
     
     country_totals.sort(key=lambda x: -x[2])
     
@@ -156,23 +167,20 @@ def print_investments_abroad(investments_by_type, countries, human_countries):
         print(f"{investor_tag}: {total_levels} building levels abroad")
         
         targets = investments_by_type[investor_id]
+        totals = target_totals[investor_id]
         
-        # Sort targets by total levels
-        sorted_targets = sorted(
-            targets.items(), 
-            key=lambda x: sum(x[1].values()), 
-            reverse=True
-        )
+        # Top 10 targets by total levels
+        top_targets = heapq.nlargest(10, targets.items(), key=lambda x: totals[x[0]])
         
-        for target_id, building_types in sorted_targets[:10]:  # Top 10 targets
-            target_tag = get_country_tag(countries, target_id)
-            target_total = sum(building_types.values())
+        for target_id, building_types in top_targets:
+            target_tag = country_tags.get(target_id, f"ID_{target_id}")
+            target_total = totals[target_id]
             
             print(f"  • {target_tag}: {target_total} levels")
             
             # Show top building types
-            sorted_types = sorted(building_types.items(), key=lambda x: -x[1])
-            for building_type, levels in sorted_types[:5]:  # Top 5 building types
+            top_types = heapq.nlargest(5, building_types.items(), key=lambda x: x[1])
+            for building_type, levels in top_types:  # Top 5 building types
                 print(f"    - {building_type}: {levels}")
         
         if len(targets) > 10:
@@ -180,21 +188,27 @@ def print_investments_abroad(investments_by_type, countries, human_countries):
             print(f"    ... and {remaining} more countries")
         print()
 
-def print_foreign_ownership_within(foreign_owned_within, countries, human_countries):
+def print_foreign_ownership_within(foreign_owned, country_tags, human_countries):
     """Print foreign ownership within human countries."""
+    foreign_owned_within = group_levels(foreign_owned)
+    
     print("=" * 80)
     print("FOREIGN OWNERSHIP WITHIN HUMAN COUNTRIES")
     print("=" * 80)
     print()
     
-    # Sort countries by total foreign ownership within them
+    # Sort countries by total foreign ownership within them (per-investor
+    # totals are computed once and reused for sorting and printing)
     country_totals = []
+    investor_totals = {}
     for target_id, investors in foreign_owned_within.items():
-        target_tag = get_country_tag(countries, target_id)
+        target_tag = country_tags.get(target_id, f"ID_{target_id}")
         if human_countries and target_tag not in human_countries:
             continue
         
-        total_levels = sum(sum(building_types.values()) for building_types in investors.values())
+        totals = {investor_id: sum(building_types.values()) for investor_id, building_types in investors.items()}
+        investor_totals[target_id] = totals
+        total_levels = sum(totals.values())
         if total_levels > 0:
             country_totals.append((target_tag, target_id, total_levels))
     
@@ -208,23 +222,24 @@ def print_foreign_ownership_within(foreign_owned_within, countries, human_countr
         print(f"{target_tag}: {total_levels} building levels foreign-owned")
         
         investors = foreign_owned_within[target_id]
+        totals = investor_totals[target_id]
         
         # Sort investors by total levels
         sorted_investors = sorted(
             investors.items(), 
-            key=lambda x: sum(x[1].values()), 
+            key=lambda x: totals[x[0]], 
             reverse=True
         )
         
         for investor_id, building_types in sorted_investors:
-            investor_tag = get_country_tag(countries, investor_id)
-            investor_total = sum(building_types.values())
+            investor_tag = country_tags.get(investor_id, f"ID_{investor_id}")
+            investor_total = totals[investor_id]
             
             print(f"  • {investor_tag}: {investor_total} levels")
             
             # Show top building types
-            sorted_types = sorted(building_types.items(), key=lambda x: -x[1])
-            for building_type, levels in sorted_types[:5]:  # Top 5 building types
+            top_types = heapq.nlargest(5, building_types.items(), key=lambda x: x[1])
+            for building_type, levels in top_types:  # Top 5 building types
                 print(f"    - {building_type}: {levels}")
         print()
 
@@ -259,7 +274,7 @@ def main():
     save_data = load_save_data(save_path)
     
     print("Analyzing detailed foreign building ownership...")
-    investments_by_type, foreign_owned_within, countries, human_countries = analyze_detailed_foreign_ownership(save_data)
+    investments, foreign_owned, country_tags, human_countries = analyze_detailed_foreign_ownership(save_data)
     
     # Capture output if needed
     if args.output:
@@ -269,8 +284,8 @@ def main():
         output = io.StringIO()
         with redirect_stdout(output):
             if not args.humans or human_countries:
-                print_investments_abroad(investments_by_type, countries, human_countries if args.humans else set())
-                print_foreign_ownership_within(foreign_owned_within, countries, human_countries if args.humans else set())
+                print_investments_abroad(investments, country_tags, human_countries if args.humans else set())
+                print_foreign_ownership_within(foreign_owned, country_tags, human_countries if args.humans else set())
         
         with open(args.output, 'w') as f:
             f.write(output.getvalue())
@@ -278,8 +293,8 @@ def main():
     else:
         # Print both reports
         if not args.humans or human_countries:
-            print_investments_abroad(investments_by_type, countries, human_countries if args.humans else set())
-            print_foreign_ownership_within(foreign_owned_within, countries, human_countries if args.humans else set())
+            print_investments_abroad(investments, country_tags, human_countries if args.humans else set())
+            print_foreign_ownership_within(foreign_owned, country_tags, human_countries if args.humans else set())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -9,19 +9,25 @@ Tracks ongoing diplomatic plays and tensions from Victoria 3 save files:
 - International incident tracking
 """
 
-import json
 import argparse
 import os
+import re
 from pathlib import Path
 from datetime import datetime
+from collections import Counter
+from functools import lru_cache
+
+from save_loader import load_databases
+
+# Year, month and day of a YYYY.M.D(.H) date
+DATE_RE = re.compile(r'(\d+)\.(\d+)\.(\d+)(?:\.|$)')
 
 
 def load_save_file(filepath):
     """Load and parse Victoria 3 save file."""
     print(f"Loading save file: {filepath}")
-    with open(filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return data
+    # Only the plays and the game date are used, so skip the rest of the save
+    return load_databases(filepath, ['diplomatic_plays', 'meta_data'])
 
 
 def get_latest_save():
@@ -44,19 +50,15 @@ def get_country_name(data, tag):
     return tag
 
 
+@lru_cache(maxsize=1024)
 def parse_date(date_str):
     """Parse Victoria 3 date format (YYYY.M.D.H)."""
     if not date_str:
         return "Unknown"
-    try:
-        parts = date_str.split('.')
-        if len(parts) >= 3:
-            year = int(parts[0])
-            month = int(parts[1])
-            day = int(parts[2])
-            return f"{year}-{month:02d}-{day:02d}"
-    except:
-        pass
+    match = DATE_RE.match(date_str) if isinstance(date_str, str) else None
+    if match:
+        year, month, day = match.groups()
+        return f"{int(year)}-{int(month):02d}-{int(day):02d}"
     return date_str
 
 
@@ -76,6 +78,11 @@ def analyze_diplomatic_plays(data):
     active_plays = 0
     escalation_risk = []
     
+    # Play type and country involvement stats, gathered in the same pass
+    play_types = Counter()
+    countries_involved = set()
+    country_involvement = Counter()
+    
     print(f"ACTIVE DIPLOMATIC PLAYS")
     print(f"{'-'*70}\n")
     
@@ -90,6 +97,22 @@ def analyze_diplomatic_plays(data):
             play_type = play_data.get('type', 'Unknown')
             target_country = play_data.get('target', '')
             initiator_country = play_data.get('initiator', '')
+            supporters = play_data.get('supporters', [])
+            opponents = play_data.get('opponents', [])
+            
+            # Count the play type and the countries involved
+            play_types[play_type] += 1
+            if initiator_country:
+                countries_involved.add(str(initiator_country))
+                country_involvement[initiator_country] += 1
+            if target_country:
+                countries_involved.add(str(target_country))
+                country_involvement[target_country] += 1
+            for participant in supporters + opponents:
+                country = participant.get('country', '')
+                if country:
+                    countries_involved.add(country)
+                    country_involvement[country] += 1
             
             target_name = get_country_name(data, str(target_country))
             initiator_name = get_country_name(data, str(initiator_country))
@@ -116,12 +139,10 @@ def analyze_diplomatic_plays(data):
                 print(f"War Goal: {war_goal}")
             
             # Participants/supporters
-            supporters = play_data.get('supporters', [])
             if supporters:
                 supporter_names = [get_country_name(data, s.get('country', '')) for s in supporters]
                 print(f"Supporters: {', '.join(supporter_names)}")
             
-            opponents = play_data.get('opponents', [])
             if opponents:
                 opponent_names = [get_country_name(data, o.get('country', '')) for o in opponents]
                 print(f"Opponents: {', '.join(opponent_names)}")
@@ -157,38 +178,10 @@ def analyze_diplomatic_plays(data):
         for play_id, level, initiator, target in escalation_risk:
             print(f"Play #{play_id}: {initiator} vs {target} (Escalation: {level})")
     
-    # Analyze by type
-    play_types = {}
-    countries_involved = set()
-    
-    for play_id, play_data in diplomatic_plays.items():
-        if isinstance(play_data, dict):
-            play_type = play_data.get('type', 'Unknown')
-            play_types[play_type] = play_types.get(play_type, 0) + 1
-            
-            # Count countries involved
-            initiator = play_data.get('initiator', '')
-            target = play_data.get('target', '')
-            if initiator:
-                countries_involved.add(str(initiator))
-            if target:
-                countries_involved.add(str(target))
-            
-            # Add supporters and opponents
-            for supporter in play_data.get('supporters', []):
-                country = supporter.get('country', '')
-                if country:
-                    countries_involved.add(country)
-            
-            for opponent in play_data.get('opponents', []):
-                country = opponent.get('country', '')
-                if country:
-                    countries_involved.add(country)
-    
     if play_types:
         print(f"\nDIPLOMATIC PLAY TYPES:")
         print(f"{'-'*30}")
-        for play_type, count in sorted(play_types.items(), key=lambda x: x[1], reverse=True):
+        for play_type, count in play_types.most_common():
             print(f"{play_type:<25} {count}")
     
     print(f"\nCOUNTRIES INVOLVED IN DIPLOMACY: {len(countries_involved)}")
@@ -197,30 +190,7 @@ def analyze_diplomatic_plays(data):
         print(f"\nMost Diplomatically Active Countries:")
         print(f"{'-'*40}")
         
-        # Count involvement per country
-        country_involvement = {}
-        for play_id, play_data in diplomatic_plays.items():
-            if isinstance(play_data, dict):
-                initiator = play_data.get('initiator', '')
-                target = play_data.get('target', '')
-                
-                if initiator:
-                    country_involvement[initiator] = country_involvement.get(initiator, 0) + 1
-                if target:
-                    country_involvement[target] = country_involvement.get(target, 0) + 1
-                
-                for supporter in play_data.get('supporters', []):
-                    country = supporter.get('country', '')
-                    if country:
-                        country_involvement[country] = country_involvement.get(country, 0) + 1
-                
-                for opponent in play_data.get('opponents', []):
-                    country = opponent.get('country', '')
-                    if country:
-                        country_involvement[country] = country_involvement.get(country, 0) + 1
-        
-        sorted_involvement = sorted(country_involvement.items(), key=lambda x: x[1], reverse=True)[:10]
-        for country, count in sorted_involvement:
+        for country, count in country_involvement.most_common(10):
             country_name = get_country_name(data, country)
             print(f"{country_name:<20} {count} plays")
     
@@ -9,227 +9,133 @@ Shows the total economic control of each country including:
 - Total effective GDP (domestic + foreign control)
 """
 
-import json
-import os
-from collections import defaultdict
+import argparse
+import sys
 from pathlib import Path
 
-def load_save_data(filepath):
-    """Load JSON save data from file."""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+import numpy as np
 
-def get_country_tag(countries, country_id):
-    """Get country tag from country ID."""
-    country = countries.get(str(country_id), {})
-    if isinstance(country, dict):
-        definition = country.get('definition', '')
-        if definition:
-            return definition
-    return f"ID_{country_id}"
+from save_index import (calculate_true_gdp, estimate_building_value, get_building_countries,
+                        get_building_row_lookup, get_country_tags, load_index, lookup_ids)
+from save_loader import load_human_countries
 
-def calculate_true_gdp(save_data):
-    """Calculate GDP using Victoria 3's actual formula."""
-    countries = save_data.get('country_manager', {}).get('database', {})
-    buildings = save_data.get('building_manager', {}).get('database', {})
-    states = save_data.get('states', {}).get('database', {})
-    
-    min_credit_base = 100000.0
-    credit_scale_factor = 0.5
-    
-    country_building_reserves = defaultdict(float)
-    
-    for building_id, building in buildings.items():
-        if not isinstance(building, dict):
-            continue
-        
-        cash_reserves = building.get('cash_reserves', 0)
-        if cash_reserves <= 0:
-            continue
-            
-        state_id = str(building.get('state'))
-        if not state_id or state_id not in states:
-            continue
-            
-        state = states[state_id]
-        country_id = state.get('country')
-        if not country_id:
-            continue
-            
-        country_building_reserves[country_id] += float(cash_reserves)
-    
-    country_gdps = {}
-    
-    for country_id, country in countries.items():
-        if not isinstance(country, dict):
-            continue
-            
-        budget = country.get('budget', {})
-        credit = float(budget.get('credit', 0))
-        
-        if credit <= 0:
-            continue
-            
-        building_reserves = country_building_reserves.get(int(country_id), 0)
-        calculated_gdp = (credit - min_credit_base - building_reserves) / credit_scale_factor
-        
-        if calculated_gdp > 0:
-            country_gdps[int(country_id)] = calculated_gdp
-    
-    return country_gdps
+def load_save_data(filepath):
+    """Load the flat column index for a save file."""
+    return load_index(filepath)
 
-def calculate_foreign_ownership(save_data):
-    """Calculate foreign ownership of GDP between countries."""
-    buildings = save_data.get('building_manager', {}).get('database', {})
-    states = save_data.get('states', {}).get('database', {})
-    countries = save_data.get('country_manager', {}).get('database', {})
-    ownership_data = save_data.get('building_ownership_manager', {}).get('database', {})
-    
-    # Track ownership: owner_country -> host_country -> value
-    ownership_matrix = defaultdict(lambda: defaultdict(float))
-    
-    # Process building ownership data
-    for ownership_id, ownership in ownership_data.items():
-        if not isinstance(ownership, dict):
-            continue
-        
-        identity = ownership.get('identity', {})
-        owned_building_id = str(ownership.get('building'))
-        levels = ownership.get('levels', 0)
-        
-        if not (owned_building_id and levels > 0):
-            continue
-        
-        # Get the owned building's details
-        building = buildings.get(owned_building_id)
-        if not building:
-            continue
-        
-        # Get building location (host country)
-        state_id = str(building.get('state'))
-        if not state_id or state_id not in states:
-            continue
-        
-        state = states[state_id]
-        host_country_id = state.get('country')
-        if not host_country_id:
-            continue
-        
-        # Determine the owner's country
-        owner_country_id = None
-        
-        if 'country' in identity:
-            # Direct country ownership
-            owner_country_id = identity['country']
-        elif 'building' in identity:
-            # Building-based ownership (company, financial district, etc.)
-            owner_building_id = str(identity['building'])
-            if owner_building_id in buildings:
-                owner_building = buildings[owner_building_id]
-                owner_state_id = str(owner_building.get('state'))
-                if owner_state_id in states:
-                    owner_state = states[owner_state_id]
-                    owner_country_id = owner_state.get('country')
-        
-        if not owner_country_id:
-            continue
-            
-        # Calculate building value
-        building_levels = building.get('levels', 1)
-        ownership_ratio = levels / building_levels if building_levels > 0 else 0
-        
-        # Use cash reserves as a proxy for building value
-        cash_reserves = building.get('cash_reserves', 0)
-        profit_after_reserves = building.get('profit_after_reserves', 0)
-        
-        # Estimate building value
-        if cash_reserves > 0:
-            building_value = cash_reserves * ownership_ratio
-        elif profit_after_reserves > 0:
-            annual_profit = profit_after_reserves * 52 * ownership_ratio
-            building_value = annual_profit * 10  # 10x profit multiplier
-        else:
-            building_value = levels * 50000  # £50K per level
-        
-        # Track ownership
-        ownership_matrix[owner_country_id][host_country_id] += float(building_value)
+def calculate_foreign_ownership(index, bld_country=None):
+    """Calculate foreign ownership of GDP between countries.
+    
+    bld_country is the precomputed get_building_countries(index), if available.
+    """
+    if bld_country is None:
+        bld_country = get_building_countries(index)
+    building_row = get_building_row_lookup(index)
+    
+    # Resolve the owned building's row and host country
+    rows = lookup_ids(building_row, index['ownership_building'])
+    host = lookup_ids(bld_country, rows)
+    
+    # Resolve the owner's country: either direct country ownership, or
+    # building-based ownership (company, financial district, etc.) located
+    # in the owner's country
+    owner_direct = index['ownership_country']
+    owner_rows = lookup_ids(building_row, index['ownership_owner_building'])
+    owner = np.where(owner_direct != -1, owner_direct, lookup_ids(bld_country, owner_rows))
+    
+    own_levels = index['ownership_levels']
+    keep = (own_levels > 0) & (host > 0) & (owner > 0)
+    rows, host, owner, own_levels = rows[keep], host[keep], owner[keep], own_levels[keep]
+    
+    # Estimate building value: cash reserves as a proxy, else 10x annual profit,
+    # else £50K per owned level
+    building_value = estimate_building_value(index, rows, own_levels)
+    
+    # Track ownership in a dense matrix: matrix[owner_country, host_country] = value.
+    # np.bincount over the flattened cell index is a much faster scatter-add than np.add.at
+    size = int(max(owner.max(initial=-1), host.max(initial=-1))) + 1
+    cells = owner.astype(np.int64) * size + host
+    ownership_matrix = np.bincount(cells, weights=building_value,
+                                   minlength=size * size).reshape(size, size)
     
     return ownership_matrix
 
-def calculate_effective_gdp(save_data):
+def _aggregate_all(index):
+    """Compute base GDPs, the ownership matrix and country tags from the index.
+    
+    The building -> country resolution is shared by both calculations, so it is done once.
+    """
+    bld_country = get_building_countries(index)
+    country_gdps = calculate_true_gdp(index, bld_country)
+    ownership_matrix = calculate_foreign_ownership(index, bld_country)
+    return country_gdps, ownership_matrix, get_country_tags(index)
+
+def calculate_effective_gdp(index):
     """Calculate effective GDP for each country."""
-    countries = save_data.get('country_manager', {}).get('database', {})
+    # Get base GDP, foreign ownership matrix and tag for each country
+    country_gdps, ownership_matrix, country_tags = _aggregate_all(index)
+    
+    # Foreign ownership is everything off the diagonal: column sums give the
+    # value foreigners own in each country, row sums what each country owns abroad
+    foreign_matrix = ownership_matrix.copy()
+    np.fill_diagonal(foreign_matrix, 0)
+    foreign_owned_by_host = foreign_matrix.sum(axis=0)
+    owned_abroad_by_owner = foreign_matrix.sum(axis=1)
+    
+    country_ids = np.array(list(country_gdps), dtype=np.int64)
+    base_gdp = np.array(list(country_gdps.values()), dtype=np.float64)
     
-    # Get base GDP for each country
-    country_gdps = calculate_true_gdp(save_data)
+    in_matrix = country_ids < len(foreign_matrix)
+    foreign_owned_in_country = np.zeros(len(country_ids))
+    foreign_owned_in_country[in_matrix] = foreign_owned_by_host[country_ids[in_matrix]]
+    gdp_owned_abroad = np.zeros(len(country_ids))
+    gdp_owned_abroad[in_matrix] = owned_abroad_by_owner[country_ids[in_matrix]]
     
-    # Get foreign ownership matrix
-    ownership_matrix = calculate_foreign_ownership(save_data)
+    # Domestic GDP control = base GDP - foreign owned
+    domestic_control = base_gdp - foreign_owned_in_country
+    
+    # Total effective GDP = domestic control + foreign investments
+    total_effective = domestic_control + gdp_owned_abroad
     
     # Calculate effective GDP for each country
     effective_gdp_data = {}
-    
-    for country_id, base_gdp in country_gdps.items():
-        tag = get_country_tag(countries, country_id)
-        
-        # Calculate foreign ownership in this country
-        foreign_owned_in_country = 0
-        for owner_id, targets in ownership_matrix.items():
-            if owner_id != country_id and country_id in targets:
-                foreign_owned_in_country += targets[country_id]
-        
-        # Calculate GDP owned abroad by this country
-        gdp_owned_abroad = 0
-        if country_id in ownership_matrix:
-            for host_id, value in ownership_matrix[country_id].items():
-                if host_id != country_id:
-                    gdp_owned_abroad += value
-        
-        # Calculate domestic ownership (what they own in their own country)
-        domestic_ownership = ownership_matrix.get(country_id, {}).get(country_id, 0)
-        
-        # Domestic GDP control = base GDP - foreign owned + adjustment for accuracy
-        # Using a more conservative approach for domestic control
-        domestic_control = base_gdp - foreign_owned_in_country
-        
-        # Total effective GDP = domestic control + foreign investments
-        total_effective = domestic_control + gdp_owned_abroad
-        
+    for country_id, base, domestic, abroad, total, foreign in zip(
+            country_ids.tolist(), base_gdp.tolist(), domestic_control.tolist(),
+            gdp_owned_abroad.tolist(), total_effective.tolist(), foreign_owned_in_country.tolist()):
         effective_gdp_data[country_id] = {
-            'tag': tag,
-            'base_gdp': base_gdp,
-            'domestic_control': domestic_control,
-            'gdp_owned_abroad': gdp_owned_abroad,
-            'total_effective': total_effective,
-            'foreign_owned_in_country': foreign_owned_in_country
+            'tag': country_tags[country_id],
+            'base_gdp': base,
+            'domestic_control': domestic,
+            'gdp_owned_abroad': abroad,
+            'total_effective': total,
+            'foreign_owned_in_country': foreign
         }
     
     return effective_gdp_data
 
-def print_effective_gdp_report(effective_gdp_data, humans_only=False):
-    """Print the effective GDP report."""
+def format_effective_gdp_report(effective_gdp_data, humans_only=False):
+    """Format the effective GDP report as text."""
     # Load human countries if filtering
-    human_countries = set()
-    if humans_only and os.path.exists('humans.txt'):
-        with open('humans.txt', 'r') as f:
-            human_countries = {line.strip() for line in f if line.strip()}
+    human_countries = load_human_countries() if humans_only else frozenset()
     
-    print("=" * 70)
-    print("EFFECTIVE GDP REPORT")
-    print("=" * 70)
-    print("Shows total economic control including foreign investments")
-    print()
-    
-    # Sort by total effective GDP
-    sorted_data = sorted(effective_gdp_data.items(), key=lambda x: x[1]['total_effective'], reverse=True)
+    report_lines = []
+    report_lines.append("=" * 70)
+    report_lines.append("EFFECTIVE GDP REPORT")
+    report_lines.append("=" * 70)
+    report_lines.append("Shows total economic control including foreign investments")
+    report_lines.append("")
     
-    # Filter if needed
+    # Filter if needed, before sorting so only the reported countries are sorted
+    rows = effective_gdp_data.items()
     if humans_only and human_countries:
-        sorted_data = [(cid, data) for cid, data in sorted_data if data['tag'] in human_countries]
+        rows = [(cid, data) for cid, data in rows if data['tag'] in human_countries]
     
-    # Print header
-    print(f"{'Tag':<5} {'Base GDP':>12} {'Domestic':>12} {'Abroad':>12} {'Total Eff.':>12}")
-    print("-" * 70)
+    # Sort by total effective GDP
+    sorted_data = sorted(rows, key=lambda x: x[1]['total_effective'], reverse=True)
+    
+    # Header
+    report_lines.append(f"{'Tag':<5} {'Base GDP':>12} {'Domestic':>12} {'Abroad':>12} {'Total Eff.':>12}")
+    report_lines.append("-" * 70)
     
     for country_id, data in sorted_data:
         tag = data['tag']
@@ -239,18 +145,18 @@ def print_effective_gdp_report(effective_gdp_data, humans_only=False):
         total = data['total_effective'] / 1e6
         
         # Format the output
-        print(f"{tag:<5} £{base:>10.1f}M £{domestic:>10.1f}M £{abroad:>10.1f}M £{total:>10.1f}M")
+        report_lines.append(f"{tag:<5} £{base:>10.1f}M £{domestic:>10.1f}M £{abroad:>10.1f}M £{total:>10.1f}M")
+    
+    report_lines.append("")
+    report_lines.append("Legend:")
+    report_lines.append("  Base GDP: Country's nominal GDP")
+    report_lines.append("  Domestic: GDP they control within their own borders")
+    report_lines.append("  Abroad: GDP they control in foreign countries")
+    report_lines.append("  Total Eff.: Total economic control (Domestic + Abroad)")
     
-    print()
-    print("Legend:")
-    print("  Base GDP: Country's nominal GDP")
-    print("  Domestic: GDP they control within their own borders")
-    print("  Abroad: GDP they control in foreign countries")
-    print("  Total Eff.: Total economic control (Domestic + Abroad)")
+    return '\n'.join(report_lines) + '\n'
 
 def main():
-    import argparse
-    
     parser = argparse.ArgumentParser(description='Generate Victoria 3 effective GDP report')
     parser.add_argument('save_file', nargs='?', help='Path to extracted JSON save file')
     parser.add_argument('-o', '--output', help='Output file for the report')
@@ -288,16 +194,14 @@ def main():
     # Generate output
     humans_only = args.humans and not args.all
     
+    report_text = format_effective_gdp_report(effective_gdp_data, humans_only)
+    
     if args.output:
         with open(args.output, 'w') as f:
-            import sys
-            old_stdout = sys.stdout
-            sys.stdout = f
-            print_effective_gdp_report(effective_gdp_data, humans_only)
-            sys.stdout = old_stdout
+            f.write(report_text)
         print(f"Effective GDP report saved to: {args.output}")
     else:
-        print_effective_gdp_report(effective_gdp_data, humans_only)
+        sys.stdout.write(report_text)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -55,22 +55,25 @@ def extract_save(save_name):
         print(f"Extracting '{save_name}'...")
         
         # Rakaly command for Victoria 3 saves
-        # Using 'json' command to convert to JSON
-        result = subprocess.run(
-            [str(rakaly_path), "json", 
-             str(input_file)],
-            capture_output=True,
-            text=True,
-            check=False
-        )
+        # Using 'json' command to convert to JSON. The JSON goes straight from
+        # rakaly's stdout into a temporary file next to the output, so the
+        # (often hundreds of MB) save never passes through Python memory
+        partial_file = output_file.with_name(output_file.name + '.partial')
+        with open(partial_file, 'wb') as f:
+            result = subprocess.run(
+                [str(rakaly_path), "json", 
+                 str(input_file)],
+                stdout=f,
+                stderr=subprocess.PIPE,
+                check=False
+            )
         
         if result.returncode != 0:
-            print(f"Error extracting save file: {result.stderr}")
+            partial_file.unlink()
+            print(f"Error extracting save file: {result.stderr.decode('utf-8', errors='replace')}")
             return False
         
-        # Write the JSON output to file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(result.stdout)
+        os.replace(partial_file, output_file)
         
         print(f"Successfully extracted to: {output_file}")
         
@@ -8,139 +8,81 @@ Analyzes foreign investment patterns, showing:
 - What percentage of their own GDP is foreign-owned
 """
 
-import json
 import argparse
+import heapq
 import os
+import sys
 from pathlib import Path
 from collections import defaultdict
 
+import numpy as np
+
+from save_index import (get_building_row_lookup, get_country_tags, get_state_country_lookup,
+                        load_index, lookup_ids)
+from save_loader import load_human_countries
+
 def load_save_data(filepath):
-    """Load JSON save data from file."""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    """Load the flat column index for a save file."""
+    return load_index(filepath)
 
-def get_country_tag(countries, country_id):
-    """Get country tag from country ID."""
-    country = countries.get(str(country_id), {})
-    if isinstance(country, dict):
-        definition = country.get('definition', '')
-        if definition:
-            return definition
-    return f"ID_{country_id}"
+def sum_by_key(keys, values):
+    """Sum values per key, returning the keys in order of first appearance and their totals."""
+    unique_keys, first_seen, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    totals = np.bincount(inverse, weights=values, minlength=len(unique_keys))
+    order = np.argsort(first_seen, kind='stable')
+    return unique_keys[order].tolist(), totals[order].tolist()
 
-def get_country_gdp(countries, country_id):
-    """Get the latest GDP value for a country."""
-    country = countries.get(str(country_id), {})
-    if not isinstance(country, dict):
-        return 0.0
+def calculate_foreign_ownership(index):
+    """Calculate foreign ownership percentages based on building ownership."""
+    building_row = get_building_row_lookup(index)
+    state_country = get_state_country_lookup(index)  # States use 'country' not 'owner'
     
-    gdp_data = country.get('gdp', {})
-    if not gdp_data:
-        return 0.0
+    # Only direct country ownership of a known building counts here
+    owned_building = index['ownership_building']
+    owner_country = index['ownership_country']
+    levels = index['ownership_levels']
+    rows = lookup_ids(building_row, owned_building)
     
-    # GDP data is stored in channels
-    channels = gdp_data.get('channels', {})
-    if channels:
-        # Get the channel with the highest index (most recent)
-        latest_channel = None
-        max_index = -1
-        for channel_id, channel_data in channels.items():
-            if isinstance(channel_data, dict) and 'index' in channel_data:
-                if channel_data['index'] > max_index:
-                    max_index = channel_data['index']
-                    latest_channel = channel_data
-        
-        if latest_channel and 'values' in latest_channel:
-            values = latest_channel['values']
-            if values and len(values) > 0:
-                # The last value in the array is the most recent
-                return float(values[-1])
+    # Get the country owning the state where the building is located
+    state_id = lookup_ids(index['building_state'], rows)
+    state_owner = lookup_ids(state_country, np.where(state_id > 0, state_id, -1))
     
-    return 0.0
-
-def calculate_foreign_ownership(save_data):
-    """Calculate foreign ownership percentages based on building ownership."""
-    countries = save_data.get('country_manager', {}).get('database', {})
-    buildings = save_data.get('building_manager', {}).get('database', {})
-    states = save_data.get('states', {}).get('database', {})  # States database
-    ownership_data = save_data.get('building_ownership_manager', {}).get('database', {})
+    keep = (owned_building > 0) & (owner_country > 0) & (levels > 0) & (state_owner > 0)
+    rows, owner_country, state_owner, levels = (
+        rows[keep], owner_country[keep], state_owner[keep], levels[keep])
     
-    # Track foreign investments: investor_country -> {target_country -> total_value}
-    foreign_investments = defaultdict(lambda: defaultdict(float))
+    # Calculate building value based on Victoria 3's actual dividend system
+    # According to Dev Diary #110: 25-50% of profit goes to cash reserves, rest as dividends
+    building_levels = index['building_levels'][rows]
+    profit_after_reserves = index['building_profit'][rows]
+    cash_reserves = index['building_cash'][rows]
     
-    # Track domestic ownership value for each country
-    domestic_value = defaultdict(float)
+    # Calculate ownership ratio
+    ownership_ratio = np.divide(levels, building_levels, out=np.zeros(len(rows)),
+                                where=building_levels > 0)
     
-    # Process all building ownership
-    for ownership_id, ownership in ownership_data.items():
-        if not isinstance(ownership, dict):
-            continue
-        
-        building_id = ownership.get('building')
-        owner_identity = ownership.get('identity', {})
-        owner_country = owner_identity.get('country') if isinstance(owner_identity, dict) else None
-        levels = ownership.get('levels', 0)
-        
-        if not (building_id and owner_country and levels > 0):
-            continue
-        
-        # Get the building
-        building = buildings.get(str(building_id))
-        if not building:
-            continue
-        
-        # Get the state where the building is located
-        state_id = building.get('state')
-        if not state_id:
-            continue
-        
-        state = states.get(str(state_id))
-        if not state:
-            continue
-        
-        state_owner = state.get('country')  # States use 'country' not 'owner'
-        if not state_owner:
-            continue
-        
-        # Calculate building value based on Victoria 3's actual dividend system
-        # According to Dev Diary #110: 25-50% of profit goes to cash reserves, rest as dividends
-        building_levels = building.get('levels', 1)
-        profit_after_reserves = building.get('profit_after_reserves', 0)
-        cash_reserves = building.get('cash_reserves', 0)
-        
-        # Calculate ownership ratio
-        ownership_ratio = levels / building_levels if building_levels > 0 else 0
-        
-        # Use Victoria 3's actual dividend calculation
-        if profit_after_reserves > 0:
-            # Building is profitable - calculate annual dividends
-            weekly_dividends = profit_after_reserves * ownership_ratio
-            annual_dividend_value = weekly_dividends * 52
-            
-            # Estimate building value using dividend yield approach (10-15% yield assumption)
-            # This represents the capital value needed to generate these dividends
-            estimated_building_value = annual_dividend_value / 0.12  # 12% yield assumption
-        else:
-            # For unprofitable buildings, use cash reserves and construction cost estimates
-            # Cash reserves represent stored value from past profits
-            cash_value = cash_reserves * ownership_ratio if cash_reserves > 0 else 0
-            
-            # Add estimated construction/infrastructure value
-            # Based on building level and type - more sophisticated than flat rate
-            construction_value = levels * 100000  # $100K per level base construction cost
-            
-            estimated_building_value = cash_value + construction_value
-        
-        # Use the estimated building value as the foreign investment value
-        annual_value = estimated_building_value
-        
-        if owner_country == state_owner:
-            # Domestic ownership
-            domestic_value[state_owner] += annual_value
-        else:
-            # Foreign ownership
-            foreign_investments[owner_country][state_owner] += annual_value
-            domestic_value[state_owner] += annual_value  # Still counts toward total domestic economy
+    # Profitable buildings: capital value of their annual dividends at a 12% yield
+    annual_dividend_value = profit_after_reserves * ownership_ratio * 52
+    dividend_value = annual_dividend_value / 0.12
+    
+    # Unprofitable buildings: cash reserves (stored value from past profits)
+    # plus $100K per level base construction cost
+    cash_value = np.where(cash_reserves > 0, cash_reserves * ownership_ratio, 0.0)
+    construction_value = levels * 100000.0
+    
+    annual_value = np.where(profit_after_reserves > 0, dividend_value,
+                            cash_value + construction_value)
+    
+    # Foreign investments: (investor_country, target_country) -> total_value
+    foreign = owner_country != state_owner
+    size = int(max(owner_country.max(initial=0), state_owner.max(initial=0))) + 1
+    pair_keys = owner_country[foreign].astype(np.int64) * size + state_owner[foreign]
+    pairs, totals = sum_by_key(pair_keys, annual_value[foreign])
+    foreign_investments = {divmod(pair, size): total for pair, total in zip(pairs, totals)}
+    
+    # Domestic economy value of each country (foreign-owned buildings still count)
+    hosts, totals = sum_by_key(state_owner, annual_value)
+    domestic_value = dict(zip(hosts, totals))
     
     return foreign_investments, domestic_value
 
@@ -155,50 +97,62 @@ def format_value(value):
     else:
         return f"${value:.0f}"
 
-def generate_report(save_data, output_file=None, humans_only=False):
-    """Generate the foreign ownership report."""
-    countries = save_data.get('country_manager', {}).get('database', {})
+class Tee:
+    """Write text to several streams at once."""
+    
+    def __init__(self, *streams):
+        self.streams = streams
+    
+    def write(self, text):
+        for stream in self.streams:
+            stream.write(text)
+
+def generate_report(index, out=sys.stdout, humans_only=False):
+    """Generate the foreign ownership report, writing it to out as it is produced."""
+    country_gdps = dict(zip(index['country_id'].tolist(), index['country_gdp'].tolist()))
     
     # Load human countries if filtering
-    human_countries = set()
-    if humans_only and os.path.exists('humans.txt'):
-        with open('humans.txt', 'r') as f:
-            human_countries = {line.strip() for line in f if line.strip()}
+    human_countries = load_human_countries() if humans_only else frozenset()
     
     # Calculate foreign ownership
     print("Calculating foreign ownership patterns...")
-    foreign_investments, domestic_value = calculate_foreign_ownership(save_data)
+    foreign_investments, domestic_value = calculate_foreign_ownership(index)
+    
+    # Resolve the tag of every country once, including investors and targets
+    # that are not countries in the save
+    country_tags = get_country_tags(index, {country_id for pair in foreign_investments
+                                            for country_id in pair})
+    
+    # Group the investments by investor, then by target (keeping investor order)
+    investments_by_investor = defaultdict(dict)
+    for (investor_id, target_id), value in foreign_investments.items():
+        investments_by_investor[investor_id][target_id] = value
+    
+    owners_by_target = defaultdict(dict)
+    for investor_id, targets in investments_by_investor.items():
+        for target_id, value in targets.items():
+            owners_by_target[target_id][investor_id] = value
     
     # Build report data
     report_data = []
     
-    for country_id, country in countries.items():
-        if not isinstance(country, dict):
-            continue
-        
-        tag = get_country_tag(countries, country_id)
+    for country_id, gdp in country_gdps.items():
+        tag = country_tags[country_id]
         
         # Filter by human countries if requested
         if humans_only and human_countries and tag not in human_countries:
             continue
         
-        gdp = get_country_gdp(countries, country_id)
         if gdp <= 0:
             continue
         
-        country_id_int = int(country_id)
-        
         # Calculate total foreign investments by this country
-        investments_by_country = foreign_investments.get(country_id_int, {})
+        investments_by_country = investments_by_investor.get(country_id, {})
         total_foreign_investment = sum(investments_by_country.values())
         
         # Calculate foreign ownership IN this country
-        foreign_owned_in_country = 0
-        foreign_owners = {}
-        for investor_id, targets in foreign_investments.items():
-            if country_id_int in targets:
-                foreign_owned_in_country += targets[country_id_int]
-                foreign_owners[investor_id] = targets[country_id_int]
+        foreign_owners = owners_by_target.get(country_id, {})
+        foreign_owned_in_country = sum(foreign_owners.values())
         
         # Calculate percentages
         foreign_investment_pct = (total_foreign_investment / gdp * 100) if gdp > 0 else 0
@@ -206,7 +160,7 @@ def generate_report(save_data, output_file=None, humans_only=False):
         
         report_data.append({
             'tag': tag,
-            'country_id': country_id_int,
+            'country_id': country_id,
             'gdp': gdp,
             'foreign_investment_value': total_foreign_investment,
             'foreign_investment_pct': foreign_investment_pct,
@@ -219,89 +173,78 @@ def generate_report(save_data, output_file=None, humans_only=False):
     # Sort by GDP
     report_data.sort(key=lambda x: -x['gdp'])
     
-    # Generate report text
-    report_lines = []
-    report_lines.append("=" * 80)
-    report_lines.append("VICTORIA 3 FOREIGN OWNERSHIP REPORT")
-    report_lines.append("=" * 80)
-    report_lines.append("")
-    report_lines.append("Note: Foreign ownership is calculated based on building ownership data.")
-    report_lines.append("Percentages show foreign-owned building value as % of GDP.")
-    report_lines.append("")
-    report_lines.append("-" * 80)
+    # Write the report line by line as it is generated
+    emit = out.write
+    
+    emit("=" * 80 + "\n")
+    emit("VICTORIA 3 FOREIGN OWNERSHIP REPORT\n")
+    emit("=" * 80 + "\n")
+    emit("\n")
+    emit("Note: Foreign ownership is calculated based on building ownership data.\n")
+    emit("Percentages show foreign-owned building value as % of GDP.\n")
+    emit("\n")
+    emit("-" * 80 + "\n")
     
     for country_data in report_data:
         tag = country_data['tag']
         gdp = country_data['gdp']
         
-        report_lines.append("")
-        report_lines.append(f"{tag}")
-        report_lines.append("=" * len(tag))
-        report_lines.append(f"GDP: {format_value(gdp)}")
+        # Countries with no foreign activity are only listed when asked for (--humans)
+        if (country_data['foreign_investment_value'] == 0 and country_data['foreign_owned_value'] == 0
+                and tag not in human_countries):
+            continue
+        
+        emit("\n")
+        emit(f"{tag}\n")
+        emit("=" * len(tag) + "\n")
+        emit(f"GDP: {format_value(gdp)}\n")
         
         # Show foreign investments BY this country
         if country_data['foreign_investment_value'] > 0:
-            report_lines.append(f"Foreign investments: {format_value(country_data['foreign_investment_value'])} ({country_data['foreign_investment_pct']:.1f}% of their GDP)")
+            emit(f"Foreign investments: {format_value(country_data['foreign_investment_value'])} ({country_data['foreign_investment_pct']:.1f}% of their GDP)\n")
             
-            # List top investment targets
+            # List top investment targets (only the top 5 are ever shown)
             if country_data['investments_by_country']:
-                report_lines.append("  Invests in:")
-                sorted_investments = sorted(
-                    country_data['investments_by_country'].items(),
-                    key=lambda x: -x[1]
-                )
-                for target_id, value in sorted_investments[:5]:
-                    target_tag = get_country_tag(countries, target_id)
-                    target_gdp = get_country_gdp(countries, target_id)
+                emit("  Invests in:\n")
+                top_investments = heapq.nlargest(
+                    5, country_data['investments_by_country'].items(), key=lambda x: x[1])
+                for target_id, value in top_investments:
+                    target_tag = country_tags[target_id]
+                    target_gdp = country_gdps.get(target_id, 0.0)
                     pct_of_target = (value / target_gdp * 100) if target_gdp > 0 else 0
-                    report_lines.append(f"    • {target_tag}: {format_value(value)} ({pct_of_target:.1f}% of {target_tag}'s GDP)")
+                    emit(f"    • {target_tag}: {format_value(value)} ({pct_of_target:.1f}% of {target_tag}'s GDP)\n")
         
         # Show foreign ownership IN this country
         if country_data['foreign_owned_value'] > 0:
-            report_lines.append(f"Foreign-owned: {format_value(country_data['foreign_owned_value'])} ({country_data['foreign_owned_pct']:.1f}% of their GDP)")
+            emit(f"Foreign-owned: {format_value(country_data['foreign_owned_value'])} ({country_data['foreign_owned_pct']:.1f}% of their GDP)\n")
             
             # List top foreign owners
             if country_data['foreign_owners']:
-                report_lines.append("  Owned by:")
-                sorted_owners = sorted(
-                    country_data['foreign_owners'].items(),
-                    key=lambda x: -x[1]
-                )
-                for owner_id, value in sorted_owners[:5]:
-                    owner_tag = get_country_tag(countries, owner_id)
+                emit("  Owned by:\n")
+                top_owners = heapq.nlargest(
+                    5, country_data['foreign_owners'].items(), key=lambda x: x[1])
+                for owner_id, value in top_owners:
+                    owner_tag = country_tags[owner_id]
                     pct_of_gdp = (value / gdp * 100) if gdp > 0 else 0
-                    report_lines.append(f"    • {owner_tag}: {format_value(value)} ({pct_of_gdp:.1f}% of GDP)")
+                    emit(f"    • {owner_tag}: {format_value(value)} ({pct_of_gdp:.1f}% of GDP)\n")
         
         if country_data['foreign_investment_value'] == 0 and country_data['foreign_owned_value'] == 0:
-            report_lines.append("  No foreign investment activity")
+            emit("  No foreign investment activity\n")
         
-        report_lines.append("")
-        report_lines.append("-" * 80)
+        emit("\n")
+        emit("-" * 80 + "\n")
     
     # Summary statistics
     total_countries = len(report_data)
     countries_investing = sum(1 for c in report_data if c['foreign_investment_value'] > 0)
     countries_with_foreign = sum(1 for c in report_data if c['foreign_owned_value'] > 0)
     
-    report_lines.append("")
-    report_lines.append("SUMMARY")
-    report_lines.append("=" * 7)
-    report_lines.append(f"Total countries analyzed: {total_countries}")
-    report_lines.append(f"Countries with foreign investments: {countries_investing}")
-    report_lines.append(f"Countries with foreign ownership: {countries_with_foreign}")
-    
-    # Output
-    report_text = '\n'.join(report_lines)
-    
-    if output_file:
-        os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else '.', exist_ok=True)
-        with open(output_file, 'w') as f:
-            f.write(report_text)
-        print(f"Report saved to: {output_file}")
-    
-    print(report_text)
-    
-    return report_text
+    emit("\n")
+    emit("SUMMARY\n")
+    emit("=" * 7 + "\n")
+    emit(f"Total countries analyzed: {total_countries}\n")
+    emit(f"Countries with foreign investments: {countries_investing}\n")
+    emit(f"Countries with foreign ownership: {countries_with_foreign}\n")
 
 def main():
     parser = argparse.ArgumentParser(description='Generate Victoria 3 foreign ownership reports')
@@ -335,8 +278,15 @@ def main():
     print(f"Loading save data...")
     save_data = load_save_data(save_path)
     
-    # Generate report
-    generate_report(save_data, args.output, args.humans)
+    # Generate report, echoing it to stdout while it is written to the file
+    if args.output:
+        output_file = args.output
+        os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else '.', exist_ok=True)
+        with open(output_file, 'w', buffering=1 << 20) as f:
+            generate_report(save_data, Tee(f, sys.stdout), args.humans)
+        print(f"Report saved to: {output_file}")
+    else:
+        generate_report(save_data, humans_only=args.humans)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
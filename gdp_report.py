@@ -4,48 +4,56 @@ Victoria 3 GDP Report Generator
 Generates GDP reports from extracted save files
 """
 
-import json
 import csv
+import os
 import sys
 from pathlib import Path
 import argparse
 from datetime import datetime
 
+from save_loader import load_databases
+
 def load_humans_list(humans_file="humans.txt"):
     """Load list of human-controlled countries from file"""
     humans = []
     try:
         with open(humans_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    humans.append(line)
+            humans = [line for line in map(str.strip, f) if line and line[0] != '#']
     except FileNotFoundError:
         print(f"Warning: {humans_file} not found. Will report on all countries.")
     return humans
 
-def get_country_name(country_data, tag):
-    """Try to get a readable country name, fallback to tag"""
-    # Try to get the definition name if available
-    if 'definition' in country_data:
-        return country_data.get('definition', tag)
-    return tag
+def get_latest_value(series):
+    """Get the latest value of a channel-0 time series, or a plain number (0 if missing)"""
+    if isinstance(series, dict):
+        # A country without history (likely just formed) has no channels yet
+        channels = series.get('channels')
+        if channels is not None:
+            channel_0 = channels.get('0')
+            if channel_0 is not None:
+                values = channel_0.get('values')
+                if values:
+                    return values[-1]
+        return 0
+    return series if isinstance(series, (int, float)) else 0
 
 def extract_gdp_data(json_file, humans_list=None):
     """Extract GDP data from Victoria 3 save JSON"""
     
     print(f"Loading save file: {json_file}")
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # Only the date and the country database are read, so stream just those
+    data = load_databases(json_file, ['date', 'country_manager.database'])
     
     # Get the game date
-    game_date = data.get('date', 'Unknown')
+    game_date = data['date'] or 'Unknown'
     
     # Get country data
     countries_data = {}
-    if 'country_manager' in data and 'database' in data['country_manager']:
-        all_countries = data['country_manager']['database']
-        
+    # Tags are checked once per country, so use a set for the lookups
+    humans_set = frozenset(humans_list) if humans_list else None
+    
+    all_countries = data['country_manager.database']
+    if all_countries:
         for country_id, country_info in all_countries.items():
             # Skip non-dict entries (references)
             if not isinstance(country_info, dict):
@@ -55,45 +63,19 @@ def extract_gdp_data(json_file, humans_list=None):
             tag = country_info.get('definition', country_id)
             
             # Skip if not in humans list (if list provided)
-            if humans_list and tag not in humans_list:
+            if humans_set and tag not in humans_set:
                 continue
             
-            # Extract GDP value (it's a time series, get the latest)
-            gdp_data = country_info.get('gdp', 0)
-            if isinstance(gdp_data, dict):
-                if 'channels' in gdp_data:
-                    # Get the latest value from the time series
-                    channel_0 = gdp_data.get('channels', {}).get('0', {})
-                    values = channel_0.get('values', [])
-                    gdp = values[-1] if values else 0
-                else:
-                    # Country exists but has no GDP history (likely just formed)
-                    gdp = 0
-            else:
-                gdp = gdp_data if isinstance(gdp_data, (int, float)) else 0
-            
-            # Try to get additional info (also time series)
-            prestige_data = country_info.get('prestige', 0)
-            if isinstance(prestige_data, dict) and 'channels' in prestige_data:
-                channel_0 = prestige_data.get('channels', {}).get('0', {})
-                values = channel_0.get('values', [])
-                prestige = values[-1] if values else 0
-            else:
-                prestige = prestige_data if isinstance(prestige_data, (int, float)) else 0
-                
-            literacy_data = country_info.get('literacy', 0)
-            if isinstance(literacy_data, dict) and 'channels' in literacy_data:
-                channel_0 = literacy_data.get('channels', {}).get('0', {})
-                values = channel_0.get('values', [])
-                literacy = values[-1] if values else 0
-            else:
-                literacy = literacy_data if isinstance(literacy_data, (int, float)) else 0
+            # Extract GDP, prestige and literacy (time series, get the latest)
+            gdp = get_latest_value(country_info.get('gdp'))
+            prestige = get_latest_value(country_info.get('prestige'))
+            literacy = get_latest_value(country_info.get('literacy'))
             
             # Skip population for now (complex to calculate)
             
             countries_data[tag] = {
                 'tag': tag,
-                'name': get_country_name(country_info, tag),
+                'name': tag,  # the save has no readable names, only the definition tag
                 'gdp': gdp,
                 'prestige': prestige,
                 'literacy': literacy
@@ -115,33 +97,25 @@ def write_csv_report(gdp_data, output_file):
     # Sort countries by GDP (descending)
     sorted_countries = sorted(countries.values(), key=lambda x: x['gdp'], reverse=True)
     
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+    with open(output_file, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
         fieldnames = ['rank', 'tag', 'name', 'gdp', 'prestige', 'literacy']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.writer(csvfile)
         
         # Write header
-        writer.writeheader()
+        writer.writerow(fieldnames)
         
         # Write metadata row
-        writer.writerow({
-            'rank': f"# Date: {gdp_data['date']}",
-            'tag': '',
-            'name': '',
-            'gdp': '',
-            'prestige': '',
-            'literacy': ''
-        })
+        writer.writerow([f"# Date: {gdp_data['date']}", '', '', '', '', ''])
         
-        # Write country data
-        for rank, country in enumerate(sorted_countries, 1):
-            writer.writerow({
-                'rank': rank,
-                'tag': country['tag'],
-                'name': country['name'],
-                'gdp': f"{country['gdp']:.2f}",
-                'prestige': f"{country['prestige']:.2f}",
-                'literacy': f"{country['literacy']:.2f}"
-            })
+        # Write country data in one batch
+        writer.writerows([
+            rank,
+            country['tag'],
+            country['name'],
+            '%.2f' % country['gdp'],
+            '%.2f' % country['prestige'],
+            '%.2f' % country['literacy']
+        ] for rank, country in enumerate(sorted_countries, 1))
     
     print(f"Report written to: {output_file}")
     print(f"Total countries: {len(sorted_countries)}")
@@ -179,12 +153,17 @@ def main():
     
     # Default to latest extracted save if not specified
     if not args.save_json:
-        extracted_dir = Path("extracted-saves")
-        json_files = list(extracted_dir.glob("*.json"))
+        # scandir hands back the paths and stats in one directory walk
+        try:
+            with os.scandir("extracted-saves") as entries:
+                json_files = [entry for entry in entries
+                              if entry.name.endswith(".json") and not entry.name.startswith(".")]
+        except FileNotFoundError:
+            json_files = []
         if not json_files:
             print("No extracted JSON files found in extracted-saves/")
             sys.exit(1)
-        args.save_json = str(max(json_files, key=lambda x: x.stat().st_mtime))
+        args.save_json = max(json_files, key=lambda entry: entry.stat().st_mtime).path
         print(f"Using latest save: {args.save_json}")
     
     # Load humans list unless --all specified
@@ -4,22 +4,25 @@ Victoria 3 GDP Time Series Extractor
 Extracts full GDP time series data from save files
 """
 
-import json
 import csv
+import os
 import sys
 from pathlib import Path
 import argparse
+import multiprocessing
+from contextlib import nullcontext
 from datetime import datetime, timedelta
 
+import numpy as np
+
+from save_loader import load_databases
+
 def load_humans_list(humans_file="humans.txt"):
     """Load list of human-controlled countries from file"""
     humans = []
     try:
         with open(humans_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    humans.append(line)
+            humans = [line for line in map(str.strip, f) if line and line[0] != '#']
     except FileNotFoundError:
         print(f"Warning: {humans_file} not found. Will report on all countries.")
     return humans
@@ -33,63 +36,97 @@ def parse_game_date(date_str):
     # Approximate date object (Victoria 3 uses its own calendar)
     return datetime(year, month, day)
 
+def sample_dates(series_start, samples, sample_rate):
+    """Get the date of every sample in a series as a datetime64[D] array"""
+    start = np.datetime64(series_start.date(), 'D')
+    return start + np.arange(samples, dtype=np.int64) * sample_rate
+
+def get_channel_values(series):
+    """Get the sample values of a channel-0 time series ([] if missing)"""
+    if isinstance(series, dict):
+        channels = series.get('channels')
+        if channels is not None:
+            channel_0 = channels.get('0')
+            if channel_0 is not None:
+                return channel_0.get('values') or []
+    return []
+
+def load_italy_gdp_values(session3_file):
+    """Load the save date and Italy's GDP values ([] if missing) from a Session 3 save
+    
+    Runs in a worker process, so only these two small values are sent back.
+    """
+    session3_data = load_databases(session3_file, ['date', 'country_manager.database'])
+    s3_date = session3_data['date'] or '1868.1.1'
+    
+    for country_info in session3_data['country_manager.database'].values():
+        if isinstance(country_info, dict) and country_info.get('definition') == 'ITA':
+            return s3_date, get_channel_values(country_info.get('gdp'))
+    return s3_date, []
+
 def extract_gdp_timeseries(json_file, humans_list=None, italy_session3_file=None):
     """Extract full GDP time series from Victoria 3 save"""
     
     print(f"Loading save file: {json_file}")
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Load Session 3 data for Italy if provided
-    session3_data = None
-    if italy_session3_file and Path(italy_session3_file).exists():
-        print(f"Loading Session 3 for Italy data: {italy_session3_file}")
-        with open(italy_session3_file, 'r', encoding='utf-8') as f:
-            session3_data = json.load(f)
     
-    # Get the game dates
-    current_date = data.get('date', 'Unknown')
-    game_start = parse_game_date('1836.1.1')
+    # Tags are checked once per country, so use a set for the lookups
+    humans_set = frozenset(humans_list) if humans_list else None
     
-    # Collect time series data
-    timeseries_data = {}
-    
-    if 'country_manager' in data and 'database' in data['country_manager']:
-        all_countries = data['country_manager']['database']
+    # Session 3 data for Italy is only needed when Italy is tracked; parse it
+    # in a worker process while the main save is parsed here. Unlike loading it
+    # only once Italy turns out to be missing, this costs a second core (and
+    # the Session 3 parse) even when the main save has Italy; the pool is
+    # terminated as soon as the result is known not to be needed.
+    prefetch_italy = (italy_session3_file and Path(italy_session3_file).exists()
+                      and 'ITA' in (humans_set or ()))
+    with multiprocessing.Pool(processes=1) if prefetch_italy else nullcontext() as session3_pool:
+        if session3_pool is not None:
+            print(f"Loading Session 3 for Italy data: {italy_session3_file}")
+            session3_result = session3_pool.apply_async(load_italy_gdp_values, (italy_session3_file,))
+        
+        # Only the date and the country database are read, so stream just those
+        data = load_databases(json_file, ['date', 'country_manager.database'])
+        
+        # Get the game dates
+        current_date = data['date'] or 'Unknown'
+        game_start = parse_game_date('1836.1.1')
+        
+        # Collect time series data
+        timeseries_data = {}
         
-        for country_id, country_info in all_countries.items():
-            # Skip non-dict entries
-            if not isinstance(country_info, dict):
-                continue
+        # The values arrays run up to the current date (year, month, day only);
+        # parsed once, when the first series needs it
+        current = None
+        
+        all_countries = data['country_manager.database']
+        if all_countries:
+            for country_id, country_info in all_countries.items():
+                # Skip non-dict entries
+                if not isinstance(country_info, dict):
+                    continue
+                    
+                tag = country_info.get('definition', country_id)
                 
-            tag = country_info.get('definition', country_id)
-            
-            # Skip if not in humans list (if provided)
-            if humans_list and tag not in humans_list:
-                continue
-            
-            # Extract GDP time series
-            gdp_data = country_info.get('gdp', {})
-            if isinstance(gdp_data, dict) and 'channels' in gdp_data:
-                channel = gdp_data['channels'].get('0', {})
-                values = channel.get('values', [])
+                # Skip if not in humans list (if provided)
+                if humans_set and tag not in humans_set:
+                    continue
                 
+                # Extract GDP time series
+                values = get_channel_values(country_info.get('gdp'))
                 if values:
                     # Victoria 3 actually samples every 7 days, not 28
                     sample_rate = 7
                     
+                    if current is None:
+                        current = parse_game_date('.'.join(current_date.split('.')[0:3]))
+                    
                     # The values array runs from some start point to current date
                     # Last value is the most recent
-                    current_parts = current_date.split('.')[0:3]  # Year, month, day only
-                    current = parse_game_date('.'.join(current_parts))
                     days_covered = (len(values) - 1) * sample_rate
                     series_start = current - timedelta(days=days_covered)
                     
                     # Generate dates for each sample
-                    dates = []
-                    for i in range(len(values)):
-                        sample_date = series_start + timedelta(days=i * sample_rate)
-                        dates.append(sample_date)
+                    dates = sample_dates(series_start, len(values), sample_rate)
                     
                     timeseries_data[tag] = {
                         'tag': tag,
@@ -100,50 +137,78 @@ def extract_gdp_timeseries(json_file, humans_list=None, italy_session3_file=None
                         'start_date': series_start,
                         'end_date': current
                     }
-    
-    # Handle Italy data from Session 3 if needed
-    if session3_data and 'ITA' in (humans_list or []):
-        if 'ITA' not in timeseries_data:  # Only if Italy missing from main data
+        
+        # Handle Italy data from Session 3 if needed (only if Italy is missing
+        # from the main data; otherwise leaving the block stops the worker)
+        if session3_pool is not None and 'ITA' not in timeseries_data:
+            s3_date, values = session3_result.get()
             print("Adding Italy data from Session 3...")
-            cm_s3 = session3_data.get('country_manager', {})
-            db_s3 = cm_s3.get('database', {})
             
-            for country_id, country_info in db_s3.items():
-                if isinstance(country_info, dict) and country_info.get('definition') == 'ITA':
-                    gdp_data = country_info.get('gdp', {})
-                    if isinstance(gdp_data, dict) and 'channels' in gdp_data:
-                        channel = gdp_data['channels'].get('0', {})
-                        values = channel.get('values', [])
-                        
-                        if values:
-                            sample_rate = 7
-                            s3_date = session3_data.get('date', '1868.1.1')
-                            s3_current = parse_game_date('.'.join(s3_date.split('.')[0:3]))
-                            days_covered = (len(values) - 1) * sample_rate
-                            series_start = s3_current - timedelta(days=days_covered)
-                            
-                            dates = []
-                            for i in range(len(values)):
-                                sample_date = series_start + timedelta(days=i * sample_rate)
-                                dates.append(sample_date)
-                            
-                            timeseries_data['ITA'] = {
-                                'tag': 'ITA',
-                                'values': values,
-                                'dates': dates,
-                                'sample_rate': sample_rate,
-                                'samples': len(values),
-                                'start_date': series_start,
-                                'end_date': s3_current,
-                                'source': 'Session 3'
-                            }
-                    break
+            if values:
+                sample_rate = 7
+                s3_current = parse_game_date('.'.join(s3_date.split('.')[0:3]))
+                days_covered = (len(values) - 1) * sample_rate
+                series_start = s3_current - timedelta(days=days_covered)
+                
+                dates = sample_dates(series_start, len(values), sample_rate)
+                
+                timeseries_data['ITA'] = {
+                    'tag': 'ITA',
+                    'values': values,
+                    'dates': dates,
+                    'sample_rate': sample_rate,
+                    'samples': len(values),
+                    'start_date': series_start,
+                    'end_date': s3_current,
+                    'source': 'Session 3'
+                }
     
     return {
         'current_date': current_date,
         'countries': timeseries_data
     }
 
+def build_gdp_grid(series, earliest_start, latest_end, sample_rate):
+    """Format the GDP series on a common timeline as a (timesteps, countries) grid of cells
+    
+    Timestep t falls on earliest_start + t * sample_rate days. A country's cell
+    holds the sample covering that date, or '' outside its start/end window.
+    """
+    timesteps = (latest_end - earliest_start).days // sample_rate + 1
+    
+    # First and last timesteps inside each country's window (the window can
+    # start between two timesteps when its series ends on another date)
+    firsts = np.array([-((earliest_start - c['start_date']).days // sample_rate) for c in series],
+                      dtype=np.int64)
+    lasts = np.array([(c['end_date'] - earliest_start).days // sample_rate for c in series],
+                     dtype=np.int64)
+    lengths = np.array([len(c['values']) for c in series], dtype=np.int64)
+    counts = np.maximum(np.minimum(lasts - firsts + 1, lengths), 0)
+    
+    # Pack the shown samples of every country into one array and scatter them
+    # into the grid in a single step; only those samples are formatted
+    values = np.concatenate([np.asarray(c['values'][:count], dtype=np.float64)
+                             for c, count in zip(series, counts.tolist())])
+    offsets = np.cumsum(counts) - counts
+    rows = np.repeat(firsts - offsets, counts) + np.arange(len(values))
+    columns = np.repeat(np.arange(len(series)), counts)
+    
+    formatted = np.char.mod('%.2f', values)
+    cells = np.zeros((timesteps, len(series)), dtype=formatted.dtype)
+    cells[rows, columns] = formatted
+    return cells
+
+def timeline_rows(cells, earliest_start, sample_rate):
+    """Yield the CSV rows of the common timeline: date index, fractional year and GDP cells"""
+    # Fractional year of every timestep: year + (day of year - 1) / 365.25
+    dates = sample_dates(earliest_start, len(cells), sample_rate)
+    year_starts = dates.astype('datetime64[Y]')
+    day_of_year = (dates - year_starts).astype(np.int64) + 1
+    years = year_starts.astype(np.int64) + 1970 + (day_of_year - 1) / 365.25
+    
+    for date_index, (year, row_cells) in enumerate(zip(years.tolist(), cells)):
+        yield [date_index, year, *row_cells]
+
 def write_timeseries_csv(timeseries_data, output_file):
     """Write GDP time series to CSV"""
     
@@ -155,14 +220,14 @@ def write_timeseries_csv(timeseries_data, output_file):
     # Find the maximum number of samples
     max_samples = max(c['samples'] for c in countries.values())
     
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+    with open(output_file, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
         # Build header
         fieldnames = ['date_index', 'year']
         for tag in sorted(countries.keys()):
             fieldnames.append(f'{tag}_gdp')
         
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
         
         # Write data rows
         # Find earliest start date among all countries
@@ -170,32 +235,12 @@ def write_timeseries_csv(timeseries_data, output_file):
         latest_end = max(c['end_date'] for c in countries.values())
         sample_rate = 7  # Victoria 3 samples every 7 days
         
-        # Generate common timeline
-        current_date = earliest_start
-        date_index = 0
+        # Lay every country's samples out on the common timeline at once
+        tags = sorted(countries.keys())
+        cells = build_gdp_grid([countries[tag] for tag in tags], earliest_start, latest_end, sample_rate)
         
-        while current_date <= latest_end:
-            row = {}
-            row['date_index'] = date_index
-            row['year'] = current_date.year + (current_date.timetuple().tm_yday - 1) / 365.25
-            
-            # Add GDP values for each country at this date
-            for tag, country_data in countries.items():
-                # Find if this country has data for this date
-                if current_date >= country_data['start_date'] and current_date <= country_data['end_date']:
-                    # Calculate which sample this date corresponds to
-                    days_from_start = (current_date - country_data['start_date']).days
-                    sample_idx = days_from_start // sample_rate
-                    if sample_idx < len(country_data['values']):
-                        row[f'{tag}_gdp'] = f"{country_data['values'][sample_idx]:.2f}"
-                    else:
-                        row[f'{tag}_gdp'] = ''
-                else:
-                    row[f'{tag}_gdp'] = ''
-            
-            writer.writerow(row)
-            current_date += timedelta(days=sample_rate)
-            date_index += 1
+        # Write the common timeline in one batch
+        writer.writerows(timeline_rows(cells, earliest_start, sample_rate))
     
     print(f"Time series written to: {output_file}")
     print(f"Countries included: {', '.join(sorted(countries.keys()))}")
@@ -241,12 +286,17 @@ def main():
     
     # Default to latest extracted save
     if not args.save_json:
-        extracted_dir = Path("extracted-saves")
-        json_files = list(extracted_dir.glob("*.json"))
+        # scandir hands back the paths and stats in one directory walk
+        try:
+            with os.scandir("extracted-saves") as entries:
+                json_files = [entry for entry in entries
+                              if entry.name.endswith(".json") and not entry.name.startswith(".")]
+        except FileNotFoundError:
+            json_files = []
         if not json_files:
             print("No extracted JSON files found")
             sys.exit(1)
-        args.save_json = str(max(json_files, key=lambda x: x.stat().st_mtime))
+        args.save_json = max(json_files, key=lambda entry: entry.stat().st_mtime).path
         print(f"Using latest save: {args.save_json}")
     
     # Load humans list unless --all specified
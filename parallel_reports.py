@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Parallel Report Runner for Victoria 3
+
+Loads the save index once and generates the battle history, budget and
+companies reports concurrently in separate worker processes. The index is a
+handful of flat NumPy columns, so handing it to the workers is cheap on every
+platform.
+
+Usage: python3 parallel_reports.py [save_file] [-d OUTPUT_DIR] [--all]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import battle_history
+import budget_report
+import companies_report
+from save_index import load_index
+
+
+def write_battle_history(index, output_path):
+    """Write the battle history report to a file."""
+    with open(output_path, 'w', buffering=1 << 20) as f:
+        battle_history.analyze_battles(index, out=f)
+
+
+def write_budget_report(index, output_path, humans_only=True):
+    """Write the budget report to a file."""
+    report_data = budget_report.generate_budget_report(index, humans_only)
+    with open(output_path, 'w', buffering=1 << 20) as f:
+        budget_report.print_budget_report(report_data, out=f)
+
+
+def write_companies_report(index, output_path, humans_only=True):
+    """Write the companies report to a file."""
+    report_data = companies_report.generate_companies_report(index, humans_only)
+    with open(output_path, 'w', buffering=1 << 20) as f:
+        companies_report.print_companies_report(report_data, out=f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the battle, budget and companies reports in parallel')
+    parser.add_argument('save_file', nargs='?', help='Path to extracted JSON save file')
+    parser.add_argument('-d', '--output-dir', default='.', help='Directory for the generated reports')
+    parser.add_argument('--all', action='store_true', help='Analyze all countries, not just human-controlled ones')
+
+    args = parser.parse_args()
+
+    # Determine save file to use
+    if args.save_file:
+        save_path = args.save_file
+    else:
+        try:
+            save_path = battle_history.get_latest_save()
+            print(f"Using latest save: {save_path}")
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            return
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    humans_only = not args.all
+
+    print(f"Loading save index: {save_path}")
+    index = load_index(save_path)
+
+    battle_path = output_dir / 'battle_history.txt'
+    budget_path = output_dir / 'budget_report.txt'
+    companies_path = output_dir / 'companies_report.txt'
+
+    with ProcessPoolExecutor() as executor:
+        futures = {
+            executor.submit(write_battle_history, index, battle_path): battle_path,
+            executor.submit(write_budget_report, index, budget_path, humans_only): budget_path,
+            executor.submit(write_companies_report, index, companies_path, humans_only): companies_path,
+        }
+        for future in as_completed(futures):
+            future.result()
+            print(f"Report saved to: {futures[future]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Flat column index of a Victoria 3 save.
+
+Parsing the full JSON save is the slowest part of most reports, yet each
+report only needs a handful of fields. This module extracts those fields
+into flat NumPy columns and persists them next to the save as an .npz file,
+so later report runs against the same save skip JSON parsing entirely.
+
+The index is rebuilt automatically whenever the save file is newer than the
+cached index or the index format changes.
+"""
+
+import os
+import zipfile
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from save_loader import load_json
+
+# Bump whenever the set or meaning of the indexed columns changes
+INDEX_VERSION = 3
+
+
+def get_index_path(save_path):
+    """Get the path of the cached index for a save file."""
+    save_path = Path(save_path)
+    return save_path.with_name(save_path.stem + '.index.npz')
+
+
+def _id_or_missing(value):
+    """Normalize an optional ID reference, using -1 for a missing reference."""
+    return value if value is not None else -1
+
+
+def _latest_gdp(country):
+    """Get the most recent stored GDP value of a country (0.0 when unknown)."""
+    gdp_data = country.get('gdp') or {}
+    channels = gdp_data.get('channels') or {}
+
+    # Get the channel with the highest index (most recent; the first one wins ties)
+    latest_channel = max((channel_data for channel_data in channels.values()
+                          if isinstance(channel_data, dict) and 'index' in channel_data),
+                         key=lambda channel_data: channel_data['index'], default=None)
+
+    if latest_channel and latest_channel.get('values'):
+        # The last value in the array is the most recent
+        return float(latest_channel['values'][-1])
+    return 0.0
+
+
+def build_index(save_data):
+    """Extract the flat columns used by the reports from parsed save data."""
+    wars = save_data.get('war_manager', {}).get('database', {})
+    battles = save_data.get('battle_manager', {}).get('database', {})
+    countries = save_data.get('country_manager', {}).get('database', {})
+    states = save_data.get('states', {}).get('database', {})
+    buildings = save_data.get('building_manager', {}).get('database', {})
+    ownerships = save_data.get('building_ownership_manager', {}).get('database', {})
+
+    battle_list = [b for b in battles.values() if isinstance(b, dict)]
+    country_items = [(int(country_id), country) for country_id, country in countries.items()
+                     if isinstance(country, dict)]
+    state_items = [(int(state_id), state) for state_id, state in states.items()
+                   if isinstance(state, dict)]
+    building_items = [(int(building_id), building) for building_id, building in buildings.items()
+                      if isinstance(building, dict)]
+    building_list = [building for _, building in building_items]
+    ownership_list = [o for o in ownerships.values() if isinstance(o, dict)]
+    identities = [o.get('identity') if isinstance(o.get('identity'), dict) else {}
+                  for o in ownership_list]
+
+    budgets = [country.get('budget', {}) for _, country in country_items]
+
+    # Missing battle/country values are stored as 0 / '' so they stay falsy
+    # like the JSON defaults; missing state/building references are stored as -1.
+    # Country/state/building IDs and levels fit comfortably in int32; money
+    # stays float64 since float32 would visibly round multi-million sums
+    return {
+        'index_version': np.array(INDEX_VERSION),
+        'game_date': np.array(save_data.get('meta_data', {}).get('game_date', 'Unknown')),
+        'war_count': np.array(len(wars)),
+        'battle_count': np.array(len(battles)),
+
+        'battle_date': np.array([b.get('date') or '' for b in battle_list], dtype=str),
+        'battle_war': np.array([b.get('war') or 0 for b in battle_list], dtype=np.int64),
+        'battle_type': np.array([b.get('type') or '' for b in battle_list], dtype=str),
+        'battle_status': np.array([b.get('status') or '' for b in battle_list], dtype=str),
+        'battle_province': np.array([b.get('province') or 0 for b in battle_list], dtype=np.int64),
+
+        'country_id': np.array([country_id for country_id, _ in country_items], dtype=np.int32),
+        'country_tag': np.array([country.get('definition') or '' for _, country in country_items],
+                                dtype=str),
+        'country_credit': np.array([float(b.get('credit', 0)) for b in budgets], dtype=np.float64),
+        'country_money': np.array([float(b.get('money', 0)) for b in budgets], dtype=np.float64),
+        'country_principal': np.array([float(b.get('principal', 0)) for b in budgets],
+                                      dtype=np.float64),
+        'country_gdp': np.array([_latest_gdp(country) for _, country in country_items],
+                                dtype=np.float64),
+
+        'state_id': np.array([state_id for state_id, _ in state_items], dtype=np.int32),
+        'state_country': np.array([_id_or_missing(state.get('country')) for _, state in state_items],
+                                  dtype=np.int32),
+
+        'building_id': np.array([building_id for building_id, _ in building_items], dtype=np.int32),
+        'building_type': np.array([b.get('building') or '' for b in building_list], dtype=str),
+        'building_state': np.array([_id_or_missing(b.get('state')) for b in building_list],
+                                   dtype=np.int32),
+        'building_cash': np.array([b.get('cash_reserves', 0) for b in building_list],
+                                  dtype=np.float64),
+        'building_levels': np.array([b.get('levels', 1) for b in building_list], dtype=np.int32),
+        'building_profit': np.array([b.get('profit_after_reserves', 0) for b in building_list],
+                                    dtype=np.float64),
+
+        # An owner is either a country directly or a building (company HQ,
+        # financial district, ...). ownership_country is -1 when the identity
+        # has no country at all and 0 when it names a falsy country.
+        'ownership_building': np.array([_id_or_missing(o.get('building')) for o in ownership_list],
+                                       dtype=np.int32),
+        'ownership_levels': np.array([o.get('levels', 0) for o in ownership_list], dtype=np.int32),
+        'ownership_country': np.array([(identity['country'] or 0) if 'country' in identity else -1
+                                       for identity in identities], dtype=np.int32),
+        'ownership_owner_building': np.array([_id_or_missing(identity.get('building'))
+                                              for identity in identities], dtype=np.int32),
+    }
+
+
+def load_index(save_path):
+    """Load the index for a save, building and caching it if needed.
+
+    Loaded indexes are memoized per save path and modification time, so
+    running several reports on the same save in one process loads it once.
+    The returned columns are shared between callers and must not be modified.
+    """
+    return _load_index(os.path.abspath(save_path), os.path.getmtime(save_path))
+
+
+@lru_cache(maxsize=4)
+def _load_index(save_path, save_mtime):
+    """Load the index for a save path at a given modification time."""
+    index_path = get_index_path(save_path)
+
+    if index_path.exists() and os.path.getmtime(index_path) >= os.path.getmtime(save_path):
+        # A damaged or incomplete index is treated as a cache miss and rebuilt
+        try:
+            with np.load(index_path) as cached:
+                index = dict(cached)
+            if int(index['index_version']) == INDEX_VERSION:
+                return index
+        except (zipfile.BadZipFile, OSError, KeyError, ValueError):
+            pass
+
+    index = build_index(load_json(save_path))
+
+    # Write to a temporary file next to the index and move it into place, so
+    # an interrupted or concurrent run never leaves a truncated index behind
+    partial_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.partial")
+    try:
+        with open(partial_path, 'wb') as f:
+            np.savez(f, **index)
+        os.replace(partial_path, index_path)
+    except OSError as e:
+        print(f"Warning: could not cache save index at {index_path}: {e}")
+        try:
+            partial_path.unlink()
+        except OSError:
+            pass
+    return index
+
+
+def get_state_country_lookup(index):
+    """Get a flat state ID -> country ID array (-1 for unknown or unowned states)."""
+    state_ids = index['state_id']
+    state_countries = index['state_country']
+
+    lookup = np.full(state_ids.max(initial=-1) + 1, -1, dtype=np.int32)
+    lookup[state_ids] = state_countries
+    return lookup
+
+
+def get_building_row_lookup(index):
+    """Get a flat building ID -> building column row array (-1 for unknown buildings)."""
+    building_ids = index['building_id']
+
+    lookup = np.full(building_ids.max(initial=-1) + 1, -1, dtype=np.int32)
+    lookup[building_ids] = np.arange(len(building_ids))
+    return lookup
+
+
+def lookup_ids(table, ids):
+    """Look up IDs in a flat ID-indexed array, returning -1 for IDs outside the table."""
+    valid = (ids >= 0) & (ids < len(table))
+    result = np.full(len(ids), -1, dtype=np.int32)
+    result[valid] = table[ids[valid]]
+    return result
+
+
+def get_country_tags(index, referenced_ids=()):
+    """Get a country ID -> tag mapping, falling back to ID_<n> for untagged countries.
+
+    IDs in referenced_ids that are not countries in the save (e.g. owners of
+    foreign investments) are included with the ID_<n> fallback as well, so the
+    reports can index the mapping directly.
+    """
+    country_tags = {
+        country_id: tag or f"ID_{country_id}"
+        for country_id, tag in zip(index['country_id'].tolist(), index['country_tag'].tolist())
+    }
+    for country_id in referenced_ids:
+        if country_id not in country_tags:
+            country_tags[country_id] = f"ID_{country_id}"
+    return country_tags
+
+
+def get_building_countries(index):
+    """Get the country of every building in the index (-1 for unknown or unowned states)."""
+    bld_country = lookup_ids(get_state_country_lookup(index), index['building_state'])
+    bld_country[bld_country == 0] = -1  # country 0 counts as unowned, like a falsy reference
+    return bld_country
+
+
+def calculate_true_gdp(index, bld_country=None):
+    """Calculate GDP using Victoria 3's actual formula from Garibaldi.
+
+    GDP = (Credit Limit - Min Credit Base - Building Cash Reserves) / Credit Scale Factor.
+    bld_country is the precomputed get_building_countries(index), if available.
+    Returns a country ID -> GDP dict of the countries with a positive GDP.
+    """
+    # Victoria 3's economic defines (from Garibaldi/defines)
+    min_credit_base = 100000.0  # COUNTRY_MIN_CREDIT_BASE = £100K
+    credit_scale_factor = 0.5   # COUNTRY_MIN_CREDIT_SCALED = 0.5 (50% of GDP)
+
+    # Only buildings with reserves in a known, owned state count
+    if bld_country is None:
+        bld_country = get_building_countries(index)
+    bld_cash = index['building_cash']
+    mask = (bld_cash > 0) & (bld_country >= 0)
+    country_building_reserves = np.bincount(bld_country[mask], weights=bld_cash[mask])
+
+    country_ids = index['country_id']
+    credit = index['country_credit']
+
+    building_reserves = np.zeros(len(country_ids))
+    has_reserves = country_ids < len(country_building_reserves)
+    building_reserves[has_reserves] = country_building_reserves[country_ids[has_reserves]]
+
+    calculated_gdp = (credit - min_credit_base - building_reserves) / credit_scale_factor
+
+    positive = (credit > 0) & (calculated_gdp > 0)
+    return dict(zip(country_ids[positive].tolist(), calculated_gdp[positive].tolist()))
+
+
+def estimate_building_value(index, rows, own_levels):
+    """Estimate the value of owned building levels, given the building column rows.
+
+    Cash reserves serve as a proxy for a building's value, else 10x its annual
+    profit, else £50K per owned level; each scaled by the owned share of levels.
+    """
+    bld_levels = index['building_levels'][rows]
+    cash_reserves = index['building_cash'][rows]
+    profit_after_reserves = index['building_profit'][rows]
+    ownership_ratio = np.divide(own_levels, bld_levels, out=np.zeros(len(rows)), where=bld_levels > 0)
+    return np.where(
+        cash_reserves > 0, cash_reserves * ownership_ratio,
+        np.where(profit_after_reserves > 0, profit_after_reserves * 52 * ownership_ratio * 10,
+                 own_levels * 50000.0))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Shared save loading for the Victoria 3 report scripts.
+
+Extracted saves are large JSON dumps, so parsing dominates the runtime of
+most reports. When orjson is installed it parses the file straight out of a
+read-only memory map (much faster and lighter on memory than reading the file
+into a string first); otherwise we fall back to the standard json module.
+
+Reports that only need a few databases from the save can stream them with
+iter_database / load_databases, which use ijson (when installed) so the rest
+of the gamestate is never materialized.
+"""
+
+import json
+import mmap
+import os
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def load_json(filepath):
+    """Load and parse an extracted JSON save file."""
+    if orjson is not None:
+        with open(filepath, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return orjson.loads(b'')
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    return orjson.loads(view)
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_database(filepath, prefix):
+    """Yield (id, entry) pairs of the object at a dotted path in the save.
+
+    With ijson the entries are streamed one at a time; otherwise the whole
+    save is loaded and the object's items are returned.
+    """
+    if ijson is not None:
+        with open(filepath, 'rb') as f:
+            yield from ijson.kvitems(f, prefix, use_float=True)
+        return
+
+    database = load_json(filepath)
+    for key in prefix.split('.'):
+        database = database.get(key, {})
+    yield from database.items()
+
+
+def load_databases(filepath, paths):
+    """Load only the objects at the given dotted paths of the save.
+
+    Returns a dict mapping each path to its object ({} when missing). With
+    ijson the top level of the save is streamed in a single pass, keeping only
+    the top-level objects the paths start with, so peak memory is bounded by
+    the requested objects (plus the largest skipped one) rather than the
+    whole save.
+    """
+    if ijson is not None:
+        wanted = {path.split('.', 1)[0] for path in paths}
+        data = {}
+        with open(filepath, 'rb') as f:
+            for key, value in ijson.kvitems(f, '', use_float=True):
+                if key in wanted and key not in data:
+                    data[key] = value
+                    if len(data) == len(wanted):
+                        break
+    else:
+        data = load_json(filepath)
+
+    databases = {}
+    for path in paths:
+        database = data
+        for key in path.split('.'):
+            database = database.get(key, {})
+        databases[path] = database
+    return databases
+
+
+@lru_cache(maxsize=1)
+def load_human_countries(filepath='humans.txt'):
+    """Load the set of human-controlled country tags from humans.txt (# starts a comment line)."""
+    if not os.path.exists(filepath):
+        return frozenset()
+    with open(filepath, 'r') as f:
+        return frozenset(line.strip() for line in f if line.strip() and not line.startswith('#'))
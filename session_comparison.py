@@ -5,14 +5,14 @@ Session Comparison Report for Victoria 3
 Compares GDP and other metrics between two sessions, showing growth and changes.
 """
 
-import json
 import os
 import argparse
 
+from save_loader import load_json
+
 def load_save_data(filepath):
     """Load JSON save data from file."""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    return load_json(filepath)
 
 def get_country_tag(countries, country_id):
     """Get country tag from country ID."""
@@ -320,28 +320,31 @@ def calculate_military_scores(save_data):
     
     return military_scores, countries
 
+def load_session_metrics(session_path, calculate_metric):
+    """Load a session's save and calculate a metric from it.
+    
+    The parsed save only lives for the duration of this call, so comparing
+    two sessions never holds both full saves in memory at once; only the
+    metric values and the country database survive.
+    """
+    print(f"Loading {session_path}...")
+    save_data = load_save_data(session_path)
+    return calculate_metric(save_data)
+
 def compare_sessions(session1_path, session2_path, metric='gdp'):
     """Compare two sessions and generate comparison data."""
-    print(f"Loading {session1_path}...")
-    session1_data = load_save_data(session1_path)
-    
-    print(f"Loading {session2_path}...")
-    session2_data = load_save_data(session2_path)
-    
-    if metric == 'gdp':
-        session1_metrics, countries1 = calculate_true_gdp(session1_data)
-        session2_metrics, countries2 = calculate_true_gdp(session2_data)
-    elif metric == 'effective_gdp':
-        session1_metrics, countries1 = calculate_effective_gdp(session1_data)
-        session2_metrics, countries2 = calculate_effective_gdp(session2_data)
-    elif metric == 'construction':
-        session1_metrics, countries1 = calculate_construction_usage(session1_data)
-        session2_metrics, countries2 = calculate_construction_usage(session2_data)
-    elif metric == 'military':
-        session1_metrics, countries1 = calculate_military_scores(session1_data)
-        session2_metrics, countries2 = calculate_military_scores(session2_data)
-    else:
+    metric_calculators = {
+        'gdp': calculate_true_gdp,
+        'effective_gdp': calculate_effective_gdp,
+        'construction': calculate_construction_usage,
+        'military': calculate_military_scores,
+    }
+    if metric not in metric_calculators:
         raise ValueError(f"Metric {metric} not supported yet")
+    calculate_metric = metric_calculators[metric]
+    
+    session1_metrics, countries1 = load_session_metrics(session1_path, calculate_metric)
+    session2_metrics, countries2 = load_session_metrics(session2_path, calculate_metric)
     
     # Load human countries
     human_countries = set()
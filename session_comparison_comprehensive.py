@@ -11,17 +11,17 @@ Compares all major metrics between two sessions including:
 - Goods production (tools, steel, etc.)
 """
 
-import json
 import os
 import sys
 import argparse
 from collections import defaultdict
 from pathlib import Path
 
+from save_loader import load_json
+
 def load_save_data(filepath):
     """Load JSON save data from file."""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    return load_json(filepath)
 
 def get_country_tag(countries, country_id):
     """Get country tag from country ID."""
@@ -8,171 +8,67 @@ GDP = (Credit Limit - Min Credit Base - Building Cash Reserves) / Credit Scale F
 This should give us the most accurate foreign ownership percentages.
 """
 
-import json
 import os
 from collections import defaultdict
 
-def load_save_data(filepath):
-    """Load JSON save data from file."""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+import numpy as np
 
-def get_country_tag(countries, country_id):
-    """Get country tag from country ID."""
-    country = countries.get(str(country_id), {})
-    if isinstance(country, dict):
-        definition = country.get('definition', '')
-        if definition:
-            return definition
-    return f"ID_{country_id}"
+from save_index import (calculate_true_gdp, estimate_building_value, get_building_countries,
+                        get_building_row_lookup, get_country_tags, load_index, lookup_ids)
+from save_loader import load_human_countries
 
-def calculate_true_gdp(save_data):
-    """Calculate GDP using Victoria 3's actual formula from Garibaldi."""
-    countries = save_data.get('country_manager', {}).get('database', {})
-    buildings = save_data.get('building_manager', {}).get('database', {})
-    states = save_data.get('states', {}).get('database', {})
-    
-    # Victoria 3's economic defines (from Garibaldi/defines)
-    min_credit_base = 100000.0  # COUNTRY_MIN_CREDIT_BASE = £100K
-    credit_scale_factor = 0.5   # COUNTRY_MIN_CREDIT_SCALED = 0.5 (50% of GDP)
-    
-    # First, calculate building cash reserves for each country
-    country_building_reserves = defaultdict(float)
-    
-    for building_id, building in buildings.items():
-        if not isinstance(building, dict):
-            continue
-        
-        cash_reserves = building.get('cash_reserves', 0)
-        if cash_reserves <= 0:
-            continue
-            
-        state_id = str(building.get('state'))
-        if not state_id or state_id not in states:
-            continue
-            
-        state = states[state_id]
-        country_id = state.get('country')
-        if not country_id:
-            continue
-            
-        country_building_reserves[country_id] += float(cash_reserves)
-    
-    # Calculate GDP for each country
-    country_gdps = {}
-    
-    for country_id, country in countries.items():
-        if not isinstance(country, dict):
-            continue
-            
-        budget = country.get('budget', {})
-        credit = float(budget.get('credit', 0))
-        
-        if credit <= 0:
-            continue
-            
-        building_reserves = country_building_reserves.get(int(country_id), 0)
-        
-        # Victoria 3's GDP formula: GDP = (Credit - Base - Reserves) / Scale
-        calculated_gdp = (credit - min_credit_base - building_reserves) / credit_scale_factor
-        
-        if calculated_gdp > 0:
-            country_gdps[int(country_id)] = calculated_gdp
-    
-    return country_gdps
+def load_save_data(filepath):
+    """Load the flat column index for a save file."""
+    return load_index(filepath)
 
-def analyze_foreign_ownership_true_gdp(save_data):
+def analyze_foreign_ownership_true_gdp(index):
     """Analyze foreign ownership using true GDP calculations."""
-    countries = save_data.get('country_manager', {}).get('database', {})
-    buildings = save_data.get('building_manager', {}).get('database', {})
-    states = save_data.get('states', {}).get('database', {})
-    ownership_data = save_data.get('building_ownership_manager', {}).get('database', {})
-    
     # Get true GDP values
     print("Calculating true GDP values using Victoria 3's formula...")
-    country_gdps = calculate_true_gdp(save_data)
+    bld_country = get_building_countries(index)
+    country_gdps = calculate_true_gdp(index, bld_country)
+    stored_gdps = dict(zip(index['country_id'].tolist(), index['country_gdp'].tolist()))
     
     # Load human countries
-    human_countries = set()
-    if os.path.exists('humans.txt'):
-        with open('humans.txt', 'r') as f:
-            human_countries = {line.strip() for line in f if line.strip()}
+    human_countries = load_human_countries()
     
-    # Track foreign investments: investor_country -> {target_country -> building_value}
-    foreign_investments = defaultdict(lambda: defaultdict(float))
+    building_row = get_building_row_lookup(index)
     
-    for ownership_id, ownership in ownership_data.items():
-        if not isinstance(ownership, dict):
-            continue
-        
-        identity = ownership.get('identity', {})
-        owned_building_id = str(ownership.get('building'))
-        levels = ownership.get('levels', 0)
-        
-        if not (owned_building_id and levels > 0):
-            continue
-        
-        # Get the owned building's details
-        building = buildings.get(owned_building_id)
-        if not building:
-            continue
-        
-        # Get building location
-        state_id = str(building.get('state'))
-        if not state_id:
-            continue
-        
-        state = states.get(state_id)
-        if not state:
-            continue
-        
-        target_country = state.get('country')
-        if not target_country:
-            continue
-        
-        # Determine the owner's country
-        owner_country = None
-        
-        if 'country' in identity:
-            # Direct country ownership
-            owner_country = identity['country']
-        elif 'building' in identity:
-            # Building-based ownership (company, financial district, etc.)
-            owner_building_id = str(identity['building'])
-            if owner_building_id in buildings:
-                owner_building = buildings[owner_building_id]
-                owner_state_id = str(owner_building.get('state'))
-                if owner_state_id in states:
-                    owner_state = states[owner_state_id]
-                    owner_country = owner_state.get('country')
-        
-        # Calculate building value using cash reserves and profitability
-        building_levels = building.get('levels', 1)
-        ownership_ratio = levels / building_levels if building_levels > 0 else 0
-        
-        # Use cash reserves as a proxy for building value
-        cash_reserves = building.get('cash_reserves', 0)
-        profit_after_reserves = building.get('profit_after_reserves', 0)
-        
-        # Estimate annual building value
-        if cash_reserves > 0:
-            # Cash reserves represent stored economic value
-            building_value = cash_reserves * ownership_ratio
-        elif profit_after_reserves > 0:
-            # Use annual profit as value proxy
-            annual_profit = profit_after_reserves * 52 * ownership_ratio
-            building_value = annual_profit * 10  # 10x profit multiplier
-        else:
-            # Basic construction value estimate
-            building_value = levels * 50000  # £50K per level
-        
-        # Track foreign ownership
-        if owner_country and target_country and owner_country != target_country:
-            foreign_investments[owner_country][target_country] += building_value
+    # Get the owned building and its location
+    rows = lookup_ids(building_row, index['ownership_building'])
+    target = lookup_ids(bld_country, rows)
     
-    return foreign_investments, country_gdps, countries, human_countries
+    # Determine the owner's country: direct country ownership, or
+    # building-based ownership (company, financial district, etc.)
+    owner_direct = index['ownership_country']
+    owner_rows = lookup_ids(building_row, index['ownership_owner_building'])
+    owner = np.where(owner_direct != -1, owner_direct, lookup_ids(bld_country, owner_rows))
+    
+    own_levels = index['ownership_levels']
+    keep = (rows >= 0) & (target > 0) & (own_levels > 0) & (owner > 0) & (owner != target)
+    rows, target, owner, own_levels = rows[keep], target[keep], owner[keep], own_levels[keep]
+    
+    # Estimate building value: cash reserves as stored economic value, else
+    # 10x annual profit, else £50K per owned level
+    building_value = estimate_building_value(index, rows, own_levels)
+    
+    # Track foreign investments: investor_country -> {target_country -> building_value}
+    foreign_investments = defaultdict(lambda: defaultdict(float))
+    for owner_country, target_country, value in zip(owner.tolist(), target.tolist(),
+                                                    building_value.tolist()):
+        foreign_investments[owner_country][target_country] += value
+    
+    # Resolve the tag of every country once, including investors and targets
+    # that are not countries in the save
+    referenced_ids = set(foreign_investments)
+    for targets in foreign_investments.values():
+        referenced_ids.update(targets)
+    country_tags = get_country_tags(index, referenced_ids)
+    
+    return foreign_investments, country_gdps, country_tags, stored_gdps, human_countries
 
-def print_true_gdp_analysis(foreign_investments, country_gdps, countries, human_countries, filter_humans=False):
+def print_true_gdp_analysis(foreign_investments, country_gdps, country_tags, stored_gdps, human_countries,
+                            filter_humans=False):
     """Print foreign ownership analysis using true GDP values."""
     print("=" * 80)
     print("TRUE GDP-BASED FOREIGN OWNERSHIP ANALYSIS")
@@ -186,29 +82,12 @@ def print_true_gdp_analysis(foreign_investments, country_gdps, countries, human_
     print("GDP COMPARISON (True Formula vs Game Storage)")
     print("-" * 50)
     for country_id, true_gdp in sorted(country_gdps.items(), key=lambda x: -x[1])[:12]:
-        country_tag = get_country_tag(countries, country_id)
+        country_tag = country_tags[country_id]
         if filter_humans and human_countries and country_tag not in human_countries:
             continue
             
         # Get stored GDP
-        country = countries.get(str(country_id), {})
-        stored_gdp = 0
-        gdp_data = country.get('gdp', {})
-        if gdp_data:
-            channels = gdp_data.get('channels', {})
-            if channels:
-                latest_channel = None
-                max_index = -1
-                for channel_id, channel_data in channels.items():
-                    if isinstance(channel_data, dict) and 'index' in channel_data:
-                        if channel_data['index'] > max_index:
-                            max_index = channel_data['index']
-                            latest_channel = channel_data
-                
-                if latest_channel and 'values' in latest_channel:
-                    values = latest_channel['values']
-                    if values and len(values) > 0:
-                        stored_gdp = float(values[-1])
+        stored_gdp = stored_gdps.get(country_id, 0.0)
         
         accuracy = (min(true_gdp, stored_gdp) / max(true_gdp, stored_gdp) * 100) if stored_gdp > 0 else 0
         print(f"{country_tag}: True=${true_gdp/1e6:.1f}M vs Stored=${stored_gdp/1e6:.1f}M ({accuracy:.1f}% match)")
@@ -217,9 +96,16 @@ def print_true_gdp_analysis(foreign_investments, country_gdps, countries, human_
     print("FOREIGN OWNERSHIP ANALYSIS")
     print("-" * 50)
     
+    # Total foreign ownership within each country, grouped by host once
+    # instead of scanning every investor for each country
+    foreign_owned_by_host = defaultdict(float)
+    for investor_id, targets in foreign_investments.items():
+        for target_id, value in targets.items():
+            foreign_owned_by_host[target_id] += value
+    
     # Analyze each country's foreign investments and ownership
     for country_id in sorted(country_gdps.keys(), key=lambda x: country_gdps[x], reverse=True):
-        country_tag = get_country_tag(countries, country_id)
+        country_tag = country_tags[country_id]
         if filter_humans and human_countries and country_tag not in human_countries:
             continue
             
@@ -230,10 +116,7 @@ def print_true_gdp_analysis(foreign_investments, country_gdps, countries, human_
         total_invested_abroad = sum(investments_abroad.values())
         
         # Calculate foreign ownership within this country
-        foreign_owned_within = 0
-        for investor_id, targets in foreign_investments.items():
-            if country_id in targets:
-                foreign_owned_within += targets[country_id]
+        foreign_owned_within = foreign_owned_by_host.get(country_id, 0)
         
         print(f"\n{country_tag}:")
         print(f"  GDP: ${country_gdp/1e6:.1f}M")
@@ -247,7 +130,7 @@ def print_true_gdp_analysis(foreign_investments, country_gdps, countries, human_
             other_targets = []
             
             for target_id, value in investments_abroad.items():
-                target_tag = get_country_tag(countries, target_id)
+                target_tag = country_tags[target_id]
                 if target_tag in human_countries:
                     human_targets.append((target_id, value, target_tag))
                 else:
@@ -310,7 +193,8 @@ def main():
     save_data = load_save_data(save_path)
     
     print("Analyzing foreign ownership using true GDP calculation...")
-    foreign_investments, country_gdps, countries, human_countries = analyze_foreign_ownership_true_gdp(save_data)
+    (foreign_investments, country_gdps, country_tags, stored_gdps,
+     human_countries) = analyze_foreign_ownership_true_gdp(save_data)
     
     # Capture output for file writing if needed
     if args.output:
@@ -319,13 +203,15 @@ def main():
         
         output = io.StringIO()
         with redirect_stdout(output):
-            print_true_gdp_analysis(foreign_investments, country_gdps, countries, human_countries, filter_humans=args.humans)
+            print_true_gdp_analysis(foreign_investments, country_gdps, country_tags, stored_gdps,
+                                    human_countries, filter_humans=args.humans)
         
         with open(args.output, 'w') as f:
             f.write(output.getvalue())
         print(f"Report saved to: {args.output}")
     else:
-        print_true_gdp_analysis(foreign_investments, country_gdps, countries, human_countries, filter_humans=args.humans)
+        print_true_gdp_analysis(foreign_investments, country_gdps, country_tags, stored_gdps,
+                                human_countries, filter_humans=args.humans)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file